@@ -0,0 +1,572 @@
+from __future__ import print_function
+import json
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import ConvertTracer
+import distance_methods
+import util_methods as util
+
+
+def random_positions(n_vehicles, area_per_vehicle=2500.0, seed=42):
+    """
+    Generates random vehicle positions spread uniformly over a square.
+    :param n_vehicles: the number of positions to generate
+    :param area_per_vehicle: the area (in m^2) of the square divided by the number of vehicles
+    :param seed: the seed of the random generator
+    :return: a list of float tuples each in the format (x, y)
+    """
+    rand = random.Random(seed)
+    side = (n_vehicles * area_per_vehicle) ** 0.5
+    return [(rand.uniform(0, side), rand.uniform(0, side)) for _ in range(n_vehicles)]
+
+
+def bench_neighbor_search(sizes=(100, 1000, 10000), min_dist_bus=3, min_dist_car=2):
+    """
+    Compares the all pairs (python and numpy) and the grid neighbor search used by Main.log_distance_violations.
+    :param sizes: the numbers of vehicles to benchmark
+    :param min_dist_bus: the minimum distance to a bus (as in Main.run_simulation)
+    :param min_dist_car: the minimum distance between two cars (as in Main.run_simulation)
+    :return: None
+    """
+    cell_size = max(min_dist_bus, min_dist_car)
+    print("Neighbor search (cell size = " + str(cell_size) + ")")
+    for n_vehicles in sizes:
+        positions = random_positions(n_vehicles)
+
+        start = time.perf_counter()
+        n_all = sum(1 for _ in distance_methods.all_pairs(positions))
+        all_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in distance_methods.pair_distances_by_kind(positions, [False] * n_vehicles):
+            pass
+        numpy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        n_grid = sum(1 for _ in distance_methods.grid_pairs(positions, cell_size))
+        grid_time = time.perf_counter() - start
+
+        print("  " + str(n_vehicles) + " vehicles: all-pairs " + "%.4fs" % all_time + " (" + str(n_all) +
+              " pairs), numpy all-pairs " + "%.4fs" % numpy_time + ", grid " + "%.4fs" % grid_time +
+              " (" + str(n_grid) + " pairs), speedup " +
+              "%.1fx" % (all_time / grid_time if grid_time > 0 else float("inf")))
+
+
+def _linear_edge_to_xy_list(edge_list, point_list, edge_id):
+    """
+    The edge_to_xy_list that scans the edge and point lists, used as the baseline of bench_route_preprocessing.
+    """
+    from math import ceil
+
+    def get_xy_from_point(point_id):
+        for point in point_list:
+            if point.get("id") == point_id:
+                return float(point.get("x")), float(point.get("y"))
+
+    for edge in edge_list:
+        if edge.get("id") == edge_id:
+            xy_list = []
+            if "from" in edge.attrib:
+                xy_list.append(get_xy_from_point(edge.get("from")))
+            if "shape" in edge.attrib:
+                shape = edge.get("shape").split(" ")
+            else:
+                lanes = [x for x in edge if x.tag == "lane"]
+                shape = lanes[int(ceil(len(lanes)/2.0))-1].get("shape").split(" ")
+            for xy_string in shape:
+                xy_tuple = (float(xy_string.split(",")[0]), float(xy_string.split(",")[1]))
+                if not (len(xy_list) > 0 and xy_tuple == xy_list[-1]):
+                    xy_list.append(xy_tuple)
+            if "to" in edge.attrib:
+                xy_list.append(get_xy_from_point(edge.get("to")))
+            return xy_list
+
+
+def bench_route_preprocessing(route_files=("osm.bus.rou.xml", "osm.passenger.rou.xml"), net_file="osm.net.xml"):
+    """
+    Compares the route preprocessing (util_methods.generate_route_dict) scanning the net lists and using SumoNet.
+    :param route_files: the *.rou.xml files
+    :param net_file: the *.net.xml file
+    :return: None
+    """
+    vehicle_list, edge_list, point_list = util.set_lists(vehicle_list=[], edge_list=[], point_list=[],
+                                                         route_files=list(route_files), net_file=net_file)
+    routes = [sub_elm.get("edges").split(" ") for vehicle in vehicle_list for sub_elm in vehicle
+              if sub_elm.tag == "route"]
+    n_edges = sum(len(route) for route in routes)
+    print("Route preprocessing (" + str(len(routes)) + " routes, " + str(n_edges) + " route edges)")
+
+    start = time.perf_counter()
+    for route in routes:
+        for edge in route:
+            _linear_edge_to_xy_list(edge_list, point_list, edge)
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    util.generate_route_dict(vehicle_list, edge_list, point_list)
+    indexed_time = time.perf_counter() - start
+
+    print("  linear scans " + "%.4fs" % linear_time + ", SumoNet " + "%.4fs" % indexed_time +
+          " (including the indexing), speedup " + "%.1fx" % (linear_time / indexed_time))
+
+
+def _concatenated_mobcons_paths(route_dict):
+    """
+    The export_route_dict_to_mobcons_path that builds each line with +=, used as the baseline of bench_mobcons_export.
+    """
+    paths = ["{ \"paths\": {\n"]
+    for vehicle_id in route_dict:
+        if len(route_dict[vehicle_id]["xy"]) > 0:
+            line = "\"" + vehicle_id + "\": ["
+            for xy in route_dict[vehicle_id]["xy"]:
+                line += "[" + str(xy[0]) + "," + str(xy[1]) + "],"
+            line = line[:-1] + "],\n"
+            paths.append(line)
+    paths[-1] = paths[-1][:-2]+"\n"
+    paths.append("}\n}")
+    return paths
+
+
+def bench_mobcons_export(route_files=("osm.bus.rou.xml", "osm.passenger.rou.xml"), net_file="osm.net.xml",
+                         precision=1):
+    """
+    Compares the mobcons paths export building every line with += and the streaming writer.
+    :param route_files: the *.rou.xml files
+    :param net_file: the *.net.xml file
+    :param precision: the coordinate precision also benchmarked with the streaming writer
+    :return: None
+    """
+    import io
+
+    vehicle_list, _, _ = util.set_lists(vehicle_list=[], route_files=list(route_files), net_file=None)
+    route_dict = util.generate_route_dict(vehicle_list, net=util.load_net(net_file))
+    n_xy = sum(len(route["xy"]) for route in route_dict.values())
+    print("Mobcons paths export (" + str(len(route_dict)) + " vehicles, " + str(n_xy) + " positions)")
+
+    start = time.perf_counter()
+    concatenated = "".join(_concatenated_mobcons_paths(route_dict))
+    concatenated_time = time.perf_counter() - start
+
+    out_file = io.StringIO()
+    start = time.perf_counter()
+    util.write_route_dict_to_mobcons_path(route_dict, out_file)
+    streaming_time = time.perf_counter() - start
+
+    rounded_file = io.StringIO()
+    start = time.perf_counter()
+    util.write_route_dict_to_mobcons_path(route_dict, rounded_file, precision)
+    rounded_time = time.perf_counter() - start
+
+    print("  += concatenation " + "%.4fs" % concatenated_time + ", streaming " + "%.4fs" % streaming_time +
+          (" (identical)" if out_file.getvalue() == concatenated else " (DIFFERENT OUTPUT)") +
+          ", streaming with precision " + str(precision) + " " + "%.4fs" % rounded_time +
+          " (" + "%.0f%%" % (100.0 * len(rounded_file.getvalue()) / len(concatenated)) + " of the size)")
+
+
+######################################################################################
+#####################-------- Synthetic benchmark suite -----------###################
+######################################################################################
+
+
+def write_synthetic_tracer(tracer_file, n_vehicles, n_timesteps, bus_share=0.1, area=5000.0, seed=42):
+    """
+    Writes a sumo tracer (fcd output) where every vehicle moves in a straight line during every timestep.
+    :param tracer_file: the file that will be created
+    :param n_vehicles: the number of vehicles in each timestep
+    :param n_timesteps: the number of timesteps
+    :param bus_share: the fraction of the vehicles that are buses
+    :param area: the side (in m) of the square where the vehicles start
+    :param seed: the seed of the random generator
+    :return: the number of vehicle records in the tracer
+    """
+    rand = random.Random(seed)
+    vehicles = []
+    for index in range(n_vehicles):
+        vehicle_id, vehicle_type = ("bus" + str(index), "bus_bus") if rand.random() < bus_share \
+            else ("veh" + str(index), "veh_passenger")
+        vehicles.append((vehicle_id, vehicle_type, rand.uniform(0, area), rand.uniform(0, area),
+                         rand.uniform(-10, 10), rand.uniform(-10, 10)))
+
+    with open(tracer_file, "w") as tracer:
+        tracer.write('<?xml version="1.0" encoding="UTF-8"?>\n<fcd-export>\n')
+        for step in range(n_timesteps):
+            lines = ['    <timestep time="%.2f">\n' % step]
+            for vehicle_id, vehicle_type, x, y, vx, vy in vehicles:
+                lines.append('        <vehicle id="%s" x="%.2f" y="%.2f" angle="0.00" type="%s" speed="%.2f" '
+                             'pos="%.2f" lane="e0_0" slope="0.00"/>\n'
+                             % (vehicle_id, x + vx * step, y + vy * step, vehicle_type, (vx * vx + vy * vy) ** 0.5,
+                                step * 10.0))
+            lines.append('    </timestep>\n')
+            tracer.writelines(lines)
+        tracer.write('</fcd-export>\n')
+    return n_vehicles * n_timesteps
+
+
+def synthetic_net(n_vehicles, route_length, grid_size=50, spacing=100.0, seed=42):
+    """
+    Generates a grid net and one random walk route of route_length edges for each vehicle.
+    :param n_vehicles: the number of vehicles
+    :param route_length: the number of edges in each route
+    :param grid_size: the number of junctions in each side of the grid
+    :param spacing: the distance (in m) between two neighbor junctions
+    :param seed: the seed of the random generator
+    :return: a tuple (vehicle_list, edge_list, point_list) as returned by util_methods.set_lists
+    """
+    rand = random.Random(seed)
+    point_list = []
+    edge_list = []
+    out_edges = {}  # {<junction_id>: <list_of_(edge_id, to_junction)>}
+    for i in range(grid_size):
+        for j in range(grid_size):
+            point_list.append(ET.Element("junction", {"id": "j%d_%d" % (i, j), "x": str(i * spacing),
+                                                      "y": str(j * spacing)}))
+    for i in range(grid_size):
+        for j in range(grid_size):
+            for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                if 0 <= i + di < grid_size and 0 <= j + dj < grid_size:
+                    edge_id = "e%d_%d_%d_%d" % (i, j, i + di, j + dj)
+                    from_x, from_y, to_x, to_y = i * spacing, j * spacing, (i + di) * spacing, (j + dj) * spacing
+                    # Two inner points, as the shapes of the osm edges
+                    shape = " ".join("%.2f,%.2f" % (from_x + (to_x - from_x) * t, from_y + (to_y - from_y) * t)
+                                     for t in (0.0, 1 / 3.0, 2 / 3.0, 1.0))
+                    edge_list.append(ET.Element("edge", {"id": edge_id, "from": "j%d_%d" % (i, j),
+                                                         "to": "j%d_%d" % (i + di, j + dj), "shape": shape}))
+                    out_edges.setdefault((i, j), []).append((edge_id, (i + di, j + dj)))
+
+    vehicle_list = []
+    for index in range(n_vehicles):
+        junction = (rand.randrange(grid_size), rand.randrange(grid_size))
+        edges = []
+        for _ in range(route_length):
+            edge_id, junction = rand.choice(out_edges[junction])
+            edges.append(edge_id)
+        vehicle = ET.Element("vehicle", {"id": "veh" + str(index), "type": "veh_passenger", "depart": str(index)})
+        ET.SubElement(vehicle, "route", {"edges": " ".join(edges)})
+        vehicle_list.append(vehicle)
+    return vehicle_list, edge_list, point_list
+
+
+def synthetic_snapshot(n_vehicles, bus_share=0.1, area_per_vehicle=2500.0, seed=42):
+    """
+    Builds a VehicleSnapshot without a simulation, with the vehicles in random positions.
+    :param n_vehicles: the number of vehicles
+    :param bus_share: the fraction of the vehicles that are buses
+    :param area_per_vehicle: the area (in m^2) of the square divided by the number of vehicles
+    :param seed: the seed of the random generator
+    :return: a VehicleSnapshot
+    """
+    from simulation_methods import VehicleSnapshot
+
+    rand = random.Random(seed)
+    snapshot = VehicleSnapshot(None)
+    for index, xy in enumerate(random_positions(n_vehicles, area_per_vehicle, seed)):
+        if rand.random() < bus_share:
+            slot = snapshot.vehicles.add("bus" + str(index), "bus_bus")
+        else:
+            slot = snapshot.vehicles.add("veh" + str(index), "veh_passenger")
+        snapshot.vehicles.xy[slot] = xy
+    return snapshot
+
+
+def measure(function, *args, **kwargs):
+    """
+    Runs a function twice, once to measure its time and once under tracemalloc to measure its peak memory.
+    :param function: the function to measure
+    :return: a tuple (seconds, peak_memory_in_bytes)
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def _result(name, params, seconds, peak, n_items, unit):
+    result = {"name": name, "params": params, "seconds": seconds, "peak_memory": peak,
+              "throughput": n_items / seconds if seconds > 0 else float("inf"), "unit": unit}
+    print("  " + name + " " + ", ".join(key + "=" + str(params[key]) for key in sorted(params)) + ": " +
+          "%.4fs" % seconds + ", " + "%.0f " % result["throughput"] + unit + ", peak " +
+          "%.1f MB" % (peak / 1e6))
+    return result
+
+
+def bench_tracer_conversion(vehicle_counts=(100, 1000), timestep_counts=(100, 1000), work_dir=None):
+    """
+    Measures ConvertTracer.sumo_tracer_to_mobcons with synthetic tracers.
+    :param vehicle_counts: the numbers of vehicles in each timestep
+    :param timestep_counts: the numbers of timesteps
+    :param work_dir: the directory of the tracers (default is a temporary directory, removed at the end)
+    :return: a list with the result of each run
+    """
+    if work_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            return bench_tracer_conversion(vehicle_counts, timestep_counts, temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    print("Tracer conversion (sumo_tracer_to_mobcons)")
+    results = []
+    for n_vehicles in vehicle_counts:
+        for n_timesteps in timestep_counts:
+            tracer_file = os.path.join(work_dir, "synthetic_%d_%d.xml" % (n_vehicles, n_timesteps))
+            n_records = write_synthetic_tracer(tracer_file, n_vehicles, n_timesteps)
+            seconds, peak = measure(ConvertTracer.sumo_tracer_to_mobcons, tracer_file, now=0, verbose=False)
+            results.append(_result("tracer_conversion", {"vehicles": n_vehicles, "timesteps": n_timesteps},
+                                   seconds, peak, n_records, "records/s"))
+            os.remove(tracer_file)
+            os.remove(tracer_file[:-3] + "txt")
+    return results
+
+
+def bench_route_dict(vehicle_counts=(1000, 10000), route_lengths=(10, 100)):
+    """
+    Measures util_methods.generate_route_dict (including the indexing of the net) with synthetic routes.
+    :param vehicle_counts: the numbers of vehicles (each with its own route)
+    :param route_lengths: the numbers of edges in each route
+    :return: a list with the result of each run
+    """
+    print("Route preprocessing (generate_route_dict)")
+    results = []
+    for n_vehicles in vehicle_counts:
+        for route_length in route_lengths:
+            vehicle_list, edge_list, point_list = synthetic_net(n_vehicles, route_length)
+            seconds, peak = measure(lambda: util.generate_route_dict(vehicle_list, net=util.SumoNet(edge_list,
+                                                                                                    point_list)))
+            results.append(_result("route_dict", {"vehicles": n_vehicles, "route_length": route_length},
+                                   seconds, peak, n_vehicles * route_length, "edges/s"))
+    return results
+
+
+def bench_route_export(vehicle_counts=(1000, 10000), route_lengths=(10, 100), work_dir=None):
+    """
+    Measures the mobcons paths export (util_methods.write_route_dict_to_mobcons_path, used by
+    export_route_dict_to_mobcons_path) with synthetic routes.
+    :param vehicle_counts: the numbers of vehicles (each with its own route)
+    :param route_lengths: the numbers of edges in each route
+    :param work_dir: the directory of the exported file (default is a temporary directory, removed at the end)
+    :return: a list with the result of each run
+    """
+    if work_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            return bench_route_export(vehicle_counts, route_lengths, temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    print("Mobcons paths export (write_route_dict_to_mobcons_path)")
+    results = []
+    paths_file = os.path.join(work_dir, "paths.json")
+    for n_vehicles in vehicle_counts:
+        for route_length in route_lengths:
+            vehicle_list, edge_list, point_list = synthetic_net(n_vehicles, route_length)
+            route_dict = util.generate_route_dict(vehicle_list, net=util.SumoNet(edge_list, point_list))
+            n_xy = sum(len(route["xy"]) for route in route_dict.values())
+            seconds, peak = measure(lambda: util.write_route_dict_to_mobcons_path(route_dict, open(paths_file, "w"),
+                                                                                  close_after=True))
+            results.append(_result("route_export", {"vehicles": n_vehicles, "route_length": route_length},
+                                   seconds, peak, n_xy, "positions/s"))
+    os.remove(paths_file)
+    return results
+
+
+def bench_distance_violations(vehicle_counts=(100, 1000, 5000), modes=("grid", "all-pairs"), min_dist_bus=3,
+                              min_dist_car=2):
+    """
+    Measures distance_methods.step_distances, the distances of one step of Main.log_distance_violations
+    (without the ViolationLog), with vehicles in random positions.
+    The throughput is the number of vehicle pairs of the step (n * (n - 1) / 2) checked per second.
+    :param vehicle_counts: the numbers of vehicles
+    :param modes: the distance modes ("grid" or "all-pairs")
+    :param min_dist_bus: the minimum distance to a bus (as in Main.run_simulation)
+    :param min_dist_car: the minimum distance between two cars (as in Main.run_simulation)
+    :return: a list with the result of each run
+    """
+    print("Distance violations (step_distances)")
+    results = []
+    for n_vehicles in vehicle_counts:
+        snapshot = synthetic_snapshot(n_vehicles)
+        positions = snapshot.positions
+        is_bus = snapshot.type_mask("bus_bus")
+        for mode in modes:
+            seconds, peak = measure(distance_methods.step_distances, {}, is_bus, min_dist_bus, min_dist_car,
+                                    positions, all_pairs=(mode == "all-pairs"), violations_needed=False)
+            results.append(_result("distance_violations", {"vehicles": n_vehicles, "mode": mode},
+                                   seconds, peak, n_vehicles * (n_vehicles - 1) / 2, "pairs/s"))
+    return results
+
+
+def run_suite(vehicle_counts=(100, 1000), route_vehicle_counts=(1000, 10000), route_lengths=(10, 100),
+              timestep_counts=(100, 1000), distance_vehicle_counts=(100, 1000, 5000)):
+    """
+    Runs every benchmark of the synthetic suite.
+    :return: a list with the result of each run
+    """
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        results = bench_tracer_conversion(vehicle_counts, timestep_counts, work_dir)
+        results += bench_route_dict(route_vehicle_counts, route_lengths)
+        results += bench_route_export(route_vehicle_counts, route_lengths, work_dir)
+        results += bench_distance_violations(distance_vehicle_counts)
+    finally:
+        shutil.rmtree(work_dir)
+    return results
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Compares the throughput of each run to the same run (same name and params) of a baseline.
+    :param results: a list of results (see run_suite)
+    :param baseline: a list of results of a previous run
+    :param tolerance: the slowdown allowed before a run is reported as a regression
+    :return: a list with the runs that regressed
+    """
+    baseline_by_run = dict(((result["name"], json.dumps(result["params"], sort_keys=True)), result)
+                           for result in baseline)
+    regressions = []
+    for result in results:
+        previous = baseline_by_run.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if previous is None:
+            continue
+        ratio = result["throughput"] / previous["throughput"]
+        if ratio < 1 - tolerance:
+            regressions.append(result)
+            print("REGRESSION " + result["name"] + " " + str(result["params"]) + ": " + "%.0f%%" % (100 * ratio) +
+                  " of the baseline throughput")
+    return regressions
+
+
+def check_lane_pairs(net_file="osm.net.xml", n_vehicles=3000, n_lanes=40, max_dist=5.0, seed=1):
+    """
+    Compares distance_methods.lane_pairs to a brute force that measures every pair of vehicles on the same lane
+    or on lanes that reach each other, with vehicles clustered on some lanes of the net and on their successors
+    and on the lanes that reach each other (many of them near the ends of the lanes, so the pairs across lanes and
+    junctions are checked).
+    :param net_file: the *.net.xml file
+    :param n_vehicles: the number of vehicles
+    :param n_lanes: the number of lanes the vehicles are clustered around
+    :param max_dist: the maximum distance of the pairs
+    :param seed: the seed of the random generator
+    :return: True if lane_pairs yields every pair once with the brute force distance
+    """
+    net = util.load_net(net_file)
+    rand = random.Random(seed)
+    seed_lanes = rand.sample(sorted(lane for lane in net.lanes if net.successors.get(lane)), n_lanes)
+    candidate_lanes = set(seed_lanes)
+    # The short lanes that reach each other (loops through junctions) can find the same pair from both vehicles
+    reachable = dict((lane, distance_methods._reachable_lanes(net, lane, max_dist)) for lane in net.lanes)
+    candidate_lanes.update(lane for lane in reachable
+                           if any(lane in reachable.get(other, ()) for other in reachable[lane]))
+    for lane in seed_lanes:
+        for successor in net.successors[lane]:
+            candidate_lanes.add(successor)
+            candidate_lanes.update(net.successors.get(successor, ()))
+    candidate_lanes = sorted(candidate_lanes)
+
+    lanes = []
+    positions = []
+    for _ in range(n_vehicles):
+        lane = rand.choice(candidate_lanes)
+        length = net.lane_length(lane)
+        lanes.append(lane)
+        positions.append(rand.choice([rand.uniform(0, min(length, 4.0)), rand.uniform(max(0.0, length - 4.0), length),
+                                      rand.uniform(0, length)]))
+
+    # Brute force: every pair of vehicles on lanes that are the same or reach each other, shortest way
+    vehicles_by_lane = {}
+    for index, lane in enumerate(lanes):
+        vehicles_by_lane.setdefault(lane, []).append(index)
+    expected = {}
+    for lane, vehicles in vehicles_by_lane.items():
+        for a in vehicles:
+            for b in vehicles:
+                if a < b and abs(positions[a] - positions[b]) < max_dist:
+                    expected[(a, b)] = abs(positions[a] - positions[b])
+        for other_lane, offset in distance_methods._reachable_lanes(net, lane, max_dist).items():
+            for a in vehicles:
+                for b in vehicles_by_lane.get(other_lane, ()):
+                    dist = net.lane_length(lane) - positions[a] + offset + positions[b]
+                    pair = (min(a, b), max(a, b))
+                    if dist < expected.get(pair, max_dist):
+                        expected[pair] = dist
+
+    found = {}
+    n_yields = 0
+    for i, j, dist in distance_methods.lane_pairs(lanes, positions, max_dist, net):
+        n_yields += 1
+        found[(min(i, j), max(i, j))] = dist
+
+    same = n_yields == len(found) and set(found) == set(expected) and \
+        all(abs(found[pair] - expected[pair]) < 1e-9 for pair in expected)
+    print("Lane pairs check (" + str(n_vehicles) + " vehicles): " + str(n_yields) + " pairs yielded, " +
+          str(len(found)) + " unique, " + str(len(expected)) + " expected, " + ("OK" if same else "DIFFERENT"))
+    return same
+
+
+def get_options():
+    optParser = optparse.OptionParser()
+    optParser.add_option("--sizes", default="100,1000,10000",
+                         help="comma separated numbers of vehicles used by the distance benchmarks")
+    optParser.add_option("--routes", action="store_true", default=False,
+                         help="only run the benchmarks that use the shipped net and route files")
+    optParser.add_option("--check", action="store_true", default=False,
+                         help="only check the lane distance mode against a brute force (exits with 1 if different)")
+    optParser.add_option("--suite", action="store_true", default=False,
+                         help="run the synthetic benchmark suite instead")
+    optParser.add_option("--vehicles", default="100,1000",
+                         help="comma separated numbers of vehicles per timestep of the synthetic tracers")
+    optParser.add_option("--timesteps", default="100,1000",
+                         help="comma separated numbers of timesteps of the synthetic tracers")
+    optParser.add_option("--route-vehicles", default="1000,10000",
+                         help="comma separated numbers of vehicles of the synthetic routes")
+    optParser.add_option("--route-lengths", default="10,100",
+                         help="comma separated numbers of edges of the synthetic routes")
+    optParser.add_option("--distance-vehicles", default="100,1000,5000",
+                         help="comma separated numbers of vehicles of the suite distance benchmarks")
+    optParser.add_option("--save", metavar="FILE", help="save the suite results in a json file")
+    optParser.add_option("--baseline", metavar="FILE",
+                         help="compare the suite results to a json file saved with --save, exits with 1 if slower")
+    optParser.add_option("--tolerance", type="float", default=0.2,
+                         help="the slowdown allowed when comparing to the baseline (default 0.2)")
+    options, args = optParser.parse_args()
+    return options
+
+
+if __name__ == '__main__':
+    options = get_options()
+    if options.check:
+        sys.exit(0 if check_lane_pairs() else 1)
+
+    if options.suite:
+        suite_results = run_suite([int(n) for n in options.vehicles.split(",")],
+                                  [int(n) for n in options.route_vehicles.split(",")],
+                                  [int(n) for n in options.route_lengths.split(",")],
+                                  [int(n) for n in options.timesteps.split(",")],
+                                  [int(n) for n in options.distance_vehicles.split(",")])
+        if options.save:
+            with open(options.save, "w") as results_file:
+                json.dump(suite_results, results_file, indent=2)
+        if options.baseline:
+            with open(options.baseline, "r") as baseline_file:
+                if compare_results(suite_results, json.load(baseline_file), options.tolerance):
+                    sys.exit(1)
+        sys.exit(0)
+
+    if not options.routes:
+        bench_neighbor_search(sizes=[int(size) for size in options.sizes.split(",")])
+    bench_route_preprocessing()
+    bench_mobcons_export()
@@ -1,46 +1,253 @@
 from __future__ import print_function
 
 import xml.etree.ElementTree as ET
+from array import array
+import json
+import multiprocessing
+import optparse
 import os
+import shutil
 import time
-from statistics import mean
+
+import numpy as np
+
+try:
+    long
+except NameError:  # Python 3 has no long, int has arbitrary precision
+    long = int
 
 
 class StrToInt:
     """
     Codes each unique string to an int.
-    Keeps a set of the previous converted string.
-    If string to convert is in the set return its index in the set.
-    If not add it to the set and return the index it is at after the addition
+    Keeps a dict of the previous converted strings and the index each one was added at.
+    If string to convert is in the dict return its index.
+    If not add it to the dict with the next index and return it.
+    The mapping can be saved and loaded so the same string is coded to the same int in many tracers.
     """
-    def __init__(self):
-        self.strSet = []
+    def __init__(self, mapping_file=None):
+        """
+        :param mapping_file: a file saved with StrToInt.save to load the mapping from (default starts empty)
+        """
+        self.strIndex = {}
+        self.shared_index = None
+        self.lock = None
+        if mapping_file is not None:
+            self.load(mapping_file)
 
     def get_int(self, str_buffer):
         """
-        Keeps a set of the previous converted string.
-        If string to convert is in the set return its index in the set.
-        If not add it to the set and return the index it is at after the addition
+        Keeps a dict of the previous converted strings.
+        If string to convert is in the dict return its index.
+        If not add it to the dict and return the index it was added at
         :param str_buffer: the string to code to int
         :return: an int that represents the string
         """
-        if self.strSet.count(str_buffer) > 0:
-            return (self.strSet.index(str_buffer) + 1) * 100
+        index = self.strIndex.get(str_buffer)
+        if index is None:
+            index = self._add(str_buffer)
+        return (index + 1) * 100
+
+    def _add(self, str_buffer):
+        if self.shared_index is None:
+            index = len(self.strIndex)
         else:
-            self.strSet.append(str_buffer)
-            return (self.strSet.index(str_buffer) + 1) * 100
+            # Another process may have already added the string
+            with self.lock:
+                index = self.shared_index.get(str_buffer)
+                if index is None:
+                    index = len(self.shared_index)
+                    self.shared_index[str_buffer] = index
+        self.strIndex[str_buffer] = index
+        return index
 
+    def share(self, manager):
+        """
+        Shares the mapping between processes, so strings added by one process get the same int in every process.
+        :param manager: a multiprocessing.Manager
+        :return: None
+        """
+        self.shared_index = manager.dict(self.strIndex)
+        self.lock = manager.Lock()
 
-def sumo_tracer_to_mobcons(tracerfile):
+    def save(self, mapping_file):
+        """
+        Saves the mapping to a json file with the strings in the order of their index.
+        :param mapping_file: a path to a file
+        :return: None
+        """
+        import json
+
+        index_by_str = self.strIndex if self.shared_index is None else dict(self.shared_index)
+        with open(mapping_file, "w") as file:
+            json.dump(sorted(index_by_str, key=index_by_str.get), file)
+
+    def load(self, mapping_file):
+        """
+        Loads a mapping saved with StrToInt.save, replacing the current one.
+        :param mapping_file: a path to a file
+        :return: None
+        """
+        import json
+
+        with open(mapping_file, "r") as file:
+            self.strIndex = dict((str_buffer, index) for index, str_buffer in enumerate(json.load(file)))
+
+
+def muid_to_int(vehicle_id, str_to_int):
     """
-    Converts a sumo generated tracer to a mobcons compatible tracer.
-    Will create mobcons tracer file with the same name as the sumo tracer file, however with the .txt extension.
-    :param tracerfile: the sumo tracer file
+    Codes the string part of a vehicle id (the part before the '.', as in "flow.12") to an int.
+    :param vehicle_id: the vehicle id
+    :param str_to_int: a StrToInt
+    :return: a string with the coded id
+    """
+    id_parts = vehicle_id.split('.')
+    mu_id = str(str_to_int.get_int(id_parts[0]))
+    if len(id_parts) > 1:
+        mu_id = mu_id + id_parts[1]
+    return mu_id
+
+
+class SpeedStatistics:
+    """
+    Keeps the speed statistics of one kind of vehicle.
+    The speeds are added in numpy arrays (see add_array) and each array is reduced in a single vectorized pass,
+    so the speeds do not need to be kept in memory. The speeds are also counted in a histogram of bin_width
+    bins (the last one has every speed from max_speed up), which gives the percentiles with bin_width precision.
+    """
+    def __init__(self, thresholds=(40, 60, 80), bin_width=1.0, max_speed=200.0):
+        """
+        :param thresholds: the speeds (km/h) the speeds above are counted
+        :param bin_width: the width (km/h) of the bins of the histogram
+        :param max_speed: the beginning of the last bin of the histogram
+        """
+        self.thresholds = np.array(sorted(thresholds), dtype=np.float64)
+        self.bin_width = float(bin_width)
+        self.max_speed = float(max_speed)
+        self.total = 0
+        self.sum = 0.0
+        self.max = None
+        self.n_above = dict((threshold, 0) for threshold in sorted(thresholds))
+        self.histogram = np.zeros(int(np.ceil(max_speed / bin_width)) + 1, dtype=np.int64)
+
+    def add(self, speed):
+        """
+        Adds a speed to the statistics.
+        :param speed: the speed in km/h
+        :return: None
+        """
+        self.add_array(np.array([speed], dtype=np.float64))
+
+    def add_array(self, speeds):
+        """
+        Adds many speeds to the statistics.
+        :param speeds: a numpy array with the speeds in km/h
+        :return: None
+        """
+        if len(speeds) == 0:
+            return
+        self.total += len(speeds)
+        self.sum += float(speeds.sum())
+        speeds_max = float(speeds.max())
+        if self.max is None or speeds_max > self.max:
+            self.max = speeds_max
+
+        # The number of thresholds below each speed, so the speeds above the i-th threshold are the ones above i
+        n_below = np.bincount(np.searchsorted(self.thresholds, speeds, side="left"),
+                              minlength=len(self.thresholds) + 1)
+        n_above = np.cumsum(n_below[::-1])[::-1]
+        for index, threshold in enumerate(self.n_above):
+            self.n_above[threshold] += int(n_above[index + 1])
+
+        bins = np.minimum((speeds / self.bin_width).astype(np.int64), len(self.histogram) - 1)
+        self.histogram += np.bincount(np.maximum(bins, 0), minlength=len(self.histogram))
+
+    def percentile(self, percent):
+        """
+        Estimates a percentile from the histogram, interpolating inside the bin.
+        :param percent: the percentile, between 0 and 100
+        :return: the speed (km/h) or None if there are no speeds
+        """
+        if self.total == 0:
+            return None
+        rank = percent / 100.0 * self.total
+        cumulative = np.cumsum(self.histogram)
+        index = min(int(np.searchsorted(cumulative, rank, side="left")), len(self.histogram) - 1)
+        if index == len(self.histogram) - 1:
+            return self.max
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (rank - before) / self.histogram[index] if self.histogram[index] > 0 else 0.0
+        return min(float((index + fraction) * self.bin_width), self.max)
+
+    def as_dict(self, percentiles=()):
+        """
+        :param percentiles: the percentiles to add (as 'p<percent>')
+        :return: a dict with the total, mean, max and number of speeds above each threshold
+        """
+        statistics = {'total': self.total, 'mean': self.sum / self.total if self.total else None, 'max': self.max}
+        for threshold in sorted(self.n_above):
+            statistics['n_above_' + str(threshold)] = self.n_above[threshold]
+        for percent in percentiles:
+            statistics['p' + str(percent)] = self.percentile(percent)
+        return statistics
+
+    def merge(self, other):
+        """
+        Adds the speeds of another SpeedStatistics (with the same thresholds and histogram) to this one.
+        :param other: a SpeedStatistics
+        :return: None
+        """
+        if sorted(self.n_above) != sorted(other.n_above) or len(self.histogram) != len(other.histogram) \
+           or self.bin_width != other.bin_width:
+            raise ValueError("Can only merge speed statistics with the same thresholds and histogram")
+        self.total += other.total
+        self.sum += other.sum
+        if self.max is None or (other.max is not None and other.max > self.max):
+            self.max = other.max
+        for threshold in self.n_above:
+            self.n_above[threshold] += other.n_above[threshold]
+        self.histogram += other.histogram
+
+
+def merge_speed_statistics(statistics_list):
+    """
+    Merges the speed statistics of many tracers (or parts of a tracer).
+    :param statistics_list: a list of dicts in the format {<kind>: SpeedStatistics}
+    :return: a dict in the format {<kind>: SpeedStatistics}
+    """
+    merged = {}
+    for speed_statistics_by_kind in statistics_list:
+        for kind in speed_statistics_by_kind:
+            statistics = speed_statistics_by_kind[kind]
+            if kind not in merged:
+                merged[kind] = SpeedStatistics(statistics.n_above.keys(), statistics.bin_width, statistics.max_speed)
+            merged[kind].merge(statistics)
+    return merged
+
+
+def save_speed_statistics(speed_statistics_by_kind, stats_file, percentiles=(50, 90, 95, 99)):
+    """
+    Saves the speed statistics, their percentiles and histograms in a json file.
+    :param speed_statistics_by_kind: a dict in the format {<kind>: SpeedStatistics}
+    :param stats_file: the json file
+    :param percentiles: the percentiles to save
     :return: None
     """
+    kinds = {}
+    for kind in speed_statistics_by_kind:
+        statistics = speed_statistics_by_kind[kind]
+        kinds[kind] = statistics.as_dict(percentiles)
+        kinds[kind]['histogram'] = {'bin_width': statistics.bin_width, 'counts': statistics.histogram.tolist()}
+    with open(stats_file, "w") as out_file:
+        json.dump(kinds, out_file, indent=2)
 
-    # MUID_CONTAINS_STRING = True
 
+def get_start_time():
+    """
+    Gets the timestamp (in ms) of the beginning of the simulation.
+    Uses the first line of output/ConstBreakLog.txt if it exists or the current time otherwise.
+    :return: a long with the timestamp
+    """
     try:
         with open(os.path.join("output", "ConstBreakLog.txt"), "r") as breakLog:
             breakLog_lines = breakLog.readlines()
@@ -49,75 +256,373 @@ def sumo_tracer_to_mobcons(tracerfile):
         now = long(round(time.time() * 1000))
         # now = 1530615660000 # 8:01
         # now = 1530625560000 # 10:45
+    return now
+
+
+def iter_timesteps(tracerfile, streaming=True):
+    """
+    Goes through the timesteps of a sumo tracer.
+    :param tracerfile: the sumo tracer file
+    :param streaming: If true will parse the file incrementally and clear each timestep after it is processed;
+                      If false will parse the whole file before the first timestep
+    :return: a generator of the timestep Elements
+    """
+    if not streaming:
+        for timestep in ET.parse(tracerfile).getroot():
+            yield timestep
+        return
+
+    context = ET.iterparse(tracerfile, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == "timestep":
+            yield elem
+            root.clear()  # Drops the timesteps already processed, so memory does not grow with the file
+
+
+def iter_timesteps_in_range(tracerfile, start, end, block_size=1 << 20):
+    """
+    Goes through the timesteps between two byte offsets of a sumo tracer (see split_tracer).
+    :param tracerfile: the sumo tracer file
+    :param start: the offset of the first <timestep
+    :param end: the offset after the last </timestep>
+    :param block_size: the number of bytes read at once
+    :return: a generator of the timestep Elements
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed(b"<chunk>")  # The range has no root element, so we add one
+    root = None
+
+    with open(tracerfile, "rb") as tracer:
+        tracer.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = tracer.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            if remaining <= 0:
+                data += b"</chunk>"
+            parser.feed(data)
+
+            for event, elem in parser.read_events():
+                if root is None:
+                    root = elem
+                elif event == "end" and elem.tag == "timestep":
+                    yield elem
+                    root.clear()
+
 
-    tree = ET.parse(tracerfile)
-    root = tree.getroot()
-    i = 0
+def _find_in_file(tracer, offset, token, block_size=1 << 20):
+    """
+    Finds the first occurrence of token after an offset in a binary file.
+    :return: the offset of the token or -1 if it is not found
+    """
+    tracer.seek(offset)
+    while True:
+        data = tracer.read(block_size)
+        if not data:
+            return -1
+        index = data.find(token)
+        if index >= 0:
+            return offset + index
+        # Keeps an overlap so a token split between two blocks is still found
+        offset += max(len(data) - len(token) + 1, 1)
+        tracer.seek(offset)
+
+
+def split_tracer(tracerfile, n_chunks):
+    """
+    Splits a sumo tracer in byte ranges that start and end at <timestep> boundaries.
+    :param tracerfile: the sumo tracer file
+    :param n_chunks: the maximum number of ranges
+    :return: a list of tuples in the format (start, end) with the byte offsets of each range
+    """
+    size = os.path.getsize(tracerfile)
+    with open(tracerfile, "rb") as tracer:
+        first = _find_in_file(tracer, 0, b"<timestep")
+        if first < 0:
+            return []
+
+        # The last range ends before the closing tag of the root element
+        tracer.seek(max(size - 4096, 0))
+        tail = tracer.read()
+        end = tail.rfind(b"</fcd-export>")
+        end = size if end < 0 else max(size - 4096, 0) + end
+
+        boundaries = [first]
+        for chunk in range(1, n_chunks):
+            boundary = _find_in_file(tracer, first + (end - first) * chunk // n_chunks, b"<timestep")
+            if boundaries[-1] < boundary < end:
+                boundaries.append(boundary)
+        boundaries.append(end)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def convert_timesteps(timesteps, mobcons_file_name, now, buffer_lines=100000, str_to_int=None,
+                      thresholds=(40, 60, 80)):
+    """
+    Writes the mobcons lines of the vehicles in some timesteps of a sumo tracer.
+    :param timesteps: an iterable of timestep Elements (see iter_timesteps)
+    :param mobcons_file_name: the mobcons tracer file that will be created
+    :param now: the timestamp (in ms) of the beginning of the simulation (see get_start_time)
+    :param buffer_lines: the number of lines kept in memory before writing them to the mobcons tracer
+    :param str_to_int: If set will code the string parts of vehicle.id to int with it (see muid_to_int)
+    :param thresholds: the speeds (km/h) the speeds above are counted (see SpeedStatistics)
+    :return: a tuple (speed_statistics_by_kind, sample_line), sample_line is the 21st line or None
+    """
     line_list = []
-    str_to_int = StrToInt()  # This will code the string parts of vehicle.id to int
-    all_speed_by_kind = {}
-    statistics_by_kind = {}
-
-    for timestep in root:
-        timestamp = str(now + int(float(timestep.get('time'))*1000))
-        for vehicle in timestep:
-            # if MUID_CONTAINS_STRING:
-            #     id_parts = str(vehicle.get('id')).split('.')
-            #     mu_id = id_parts[0]
-            #     mu_id = str(str_to_int.get_int(mu_id))
-            #     mu_id = mu_id + id_parts[1]
-            # else:
-            #     mu_id = str(vehicle.get('id'))
-
-            mu_id = str(vehicle.get('id'))
-            x = str(vehicle.get('x'))
-            y = str(vehicle.get('y'))
-            kind_of_mu = str(vehicle.get('type'))
-            speed_float = round(float(vehicle.get('speed')) * 3.6, 3)  # convert m/s to km/s and round to 3 dec. places
-            speed_str = str(speed_float)
-
-            line_list.append(mu_id + ',' + x + ',' + y + ',' + speed_str + ',' + timestamp + ',' + kind_of_mu + '\n')
-
-            if kind_of_mu in all_speed_by_kind:
-                all_speed_by_kind[kind_of_mu].append(speed_float)
-            else:
-                all_speed_by_kind[kind_of_mu] = []
-                all_speed_by_kind[kind_of_mu].append(speed_float)
-                statistics_by_kind[kind_of_mu] = {}
-
-    for kind in all_speed_by_kind:
-        statistics_by_kind[kind]['total'] = len(all_speed_by_kind[kind])
-        statistics_by_kind[kind]['mean'] = mean(all_speed_by_kind[kind])
-        statistics_by_kind[kind]['max'] = max(all_speed_by_kind[kind])
-        statistics_by_kind[kind]['n_above_40'] = sum(spd > 40 for spd in all_speed_by_kind[kind])
-        statistics_by_kind[kind]['n_above_60'] = sum(spd > 60 for spd in all_speed_by_kind[kind])
-        statistics_by_kind[kind]['n_above_80'] = sum(spd > 80 for spd in all_speed_by_kind[kind])
-
-    for kind in statistics_by_kind:
-        print('Statistics for '+kind+str(statistics_by_kind[kind]))
-
-    with open(tracerfile[:-3]+"txt", "w") as mobcons_tracer:
+    n_lines = 0
+    sample_line = None
+    speed_statistics_by_kind = {}
+    speeds_by_kind = {}  # The speeds of the lines in line_list, added to the statistics when the lines are written
+
+    with open(mobcons_file_name, "w") as mobcons_tracer:
+        for timestep in timesteps:
+            timestamp = str(now + int(float(timestep.get('time'))*1000))
+            for vehicle in timestep:
+                if str_to_int is not None:
+                    mu_id = muid_to_int(str(vehicle.get('id')), str_to_int)
+                else:
+                    mu_id = str(vehicle.get('id'))
+                x = str(vehicle.get('x'))
+                y = str(vehicle.get('y'))
+                kind_of_mu = str(vehicle.get('type'))
+                speed_float = round(float(vehicle.get('speed')) * 3.6, 3)  # convert m/s to km/s and round to 3 dec. places
+                speed_str = str(speed_float)
+
+                line = mu_id + ',' + x + ',' + y + ',' + speed_str + ',' + timestamp + ',' + kind_of_mu + '\n'
+                line_list.append(line)
+                if n_lines == 20:
+                    sample_line = line
+                n_lines += 1
+
+                if kind_of_mu not in speeds_by_kind:
+                    speeds_by_kind[kind_of_mu] = array('d')
+                    speed_statistics_by_kind[kind_of_mu] = SpeedStatistics(thresholds)
+                speeds_by_kind[kind_of_mu].append(speed_float)
+
+            # Writes the lines in chunks so they are not all kept in memory
+            if len(line_list) >= buffer_lines:
+                mobcons_tracer.writelines(line_list)
+                line_list = []
+                _add_speeds(speeds_by_kind, speed_statistics_by_kind)
+
         mobcons_tracer.writelines(line_list)
+        _add_speeds(speeds_by_kind, speed_statistics_by_kind)
+
+    return speed_statistics_by_kind, sample_line
+
 
-    print(line_list[20])
+def _add_speeds(speeds_by_kind, speed_statistics_by_kind):
+    for kind in speeds_by_kind:
+        speed_statistics_by_kind[kind].add_array(np.frombuffer(speeds_by_kind[kind], dtype=np.float64))
+        speeds_by_kind[kind] = array('d')
+
+
+def print_speed_statistics(speed_statistics_by_kind):
+    """
+    Prints the speed statistics of each kind of vehicle.
+    :param speed_statistics_by_kind: a dict in the format {<kind>: SpeedStatistics}
+    :return: None
+    """
+    for kind in speed_statistics_by_kind:
+        print('Statistics for '+kind+str(speed_statistics_by_kind[kind].as_dict()))
 
 
-def main():
+def sumo_tracer_to_mobcons(tracerfile, streaming=True, buffer_lines=100000, now=None, verbose=True,
+                           str_to_int=None, thresholds=(40, 60, 80), percentiles=(50, 90, 95, 99)):
+    """
+    Converts a sumo generated tracer to a mobcons compatible tracer.
+    Will create mobcons tracer file with the same name as the sumo tracer file, however with the .txt extension,
+    and the speed statistics (see save_speed_statistics) with the .stats.json extension.
+    :param tracerfile: the sumo tracer file
+    :param streaming: If true will parse the sumo tracer incrementally (see iter_timesteps)
+    :param buffer_lines: the number of lines kept in memory before writing them to the mobcons tracer
+    :param now: the timestamp (in ms) of the beginning of the simulation (default will use get_start_time)
+    :param verbose: If true will print the speed statistics and a sample line
+    :param str_to_int: If set will code the string parts of vehicle.id to int with it (see muid_to_int)
+    :param thresholds: the speeds (km/h) the speeds above are counted
+    :param percentiles: the percentiles saved with the speed statistics
+    :return: a dict with the SpeedStatistics of each kind of vehicle
+    """
+    if now is None:
+        now = get_start_time()
+
+    speed_statistics_by_kind, sample_line = convert_timesteps(iter_timesteps(tracerfile, streaming),
+                                                              tracerfile[:-3]+"txt", now, buffer_lines, str_to_int,
+                                                              thresholds)
+    save_speed_statistics(speed_statistics_by_kind, tracerfile[:-3]+"stats.json", percentiles)
+    if verbose:
+        print_speed_statistics(speed_statistics_by_kind)
+        print(sample_line)
+
+    return speed_statistics_by_kind
+
+
+def _convert_tracer(args):
+    tracerfile, now, str_to_int, thresholds, percentiles = args
+    return sumo_tracer_to_mobcons(tracerfile, now=now, verbose=False, str_to_int=str_to_int, thresholds=thresholds,
+                                  percentiles=percentiles)
+
+
+def _convert_tracer_range(args):
+    tracerfile, start, end, part_file_name, now, str_to_int, thresholds = args
+    speed_statistics_by_kind, _ = convert_timesteps(iter_timesteps_in_range(tracerfile, start, end),
+                                                    part_file_name, now, str_to_int=str_to_int, thresholds=thresholds)
+    return speed_statistics_by_kind
+
+
+def sumo_tracer_to_mobcons_in_chunks(tracerfile, n_chunks, workers=None, now=None, verbose=True,
+                                     str_to_int=None, thresholds=(40, 60, 80), percentiles=(50, 90, 95, 99)):
+    """
+    Converts a (huge) sumo tracer to a mobcons tracer, converting chunks of the tracer in parallel.
+    The chunks are split at <timestep> boundaries, converted into part files and then concatenated in order.
+    :param tracerfile: the sumo tracer file
+    :param n_chunks: the number of chunks
+    :param workers: the number of processes (default will use the number of cpus)
+    :param now: the timestamp (in ms) of the beginning of the simulation (default will use get_start_time)
+    :param verbose: If true will print the speed statistics
+    :param str_to_int: If set will code the string parts of vehicle.id to int with it,
+                       it must be shared (see StrToInt.share) so every chunk codes the same string to the same int
+    :param thresholds: the speeds (km/h) the speeds above are counted
+    :param percentiles: the percentiles saved with the speed statistics
+    :return: a dict with the SpeedStatistics of each kind of vehicle
+    """
+    if now is None:
+        now = get_start_time()
+
+    mobcons_file_name = tracerfile[:-3]+"txt"
+    tasks = [(tracerfile, start, end, mobcons_file_name + ".part" + str(index), now, str_to_int, thresholds)
+             for index, (start, end) in enumerate(split_tracer(tracerfile, n_chunks))]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        statistics_list = pool.map(_convert_tracer_range, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    with open(mobcons_file_name, "w") as mobcons_tracer:
+        for task in tasks:
+            with open(task[3], "r") as part_file:
+                shutil.copyfileobj(part_file, mobcons_tracer)
+            os.remove(task[3])
+
+    speed_statistics_by_kind = merge_speed_statistics(statistics_list)
+    save_speed_statistics(speed_statistics_by_kind, tracerfile[:-3]+"stats.json", percentiles)
+    if verbose:
+        print_speed_statistics(speed_statistics_by_kind)
+
+    return speed_statistics_by_kind
+
+
+def parse_numbers(numbers):
+    """
+    :param numbers: a string with comma separated numbers
+    :return: a list with the numbers, as int when they have no decimal part
+    """
+    parsed = []
+    for number in numbers.split(","):
+        number = float(number)
+        parsed.append(int(number) if number.is_integer() else number)
+    return parsed
+
+
+def get_options():
+    optParser = optparse.OptionParser()
+    optParser.add_option("--workers", type="int", default=None,
+                         help="the number of processes used to convert the tracers (default is the number of cpus)")
+    optParser.add_option("--chunks", type="int", default=1,
+                         help="split each tracer in this number of chunks that are converted in parallel")
+    optParser.add_option("--muid-contains-string", action="store_true", default=False,
+                         help="code the string part of the vehicle ids to int")
+    optParser.add_option("--id-mapping", default=None,
+                         help="a json file with the strings already coded to int, it is updated after the conversion")
+    optParser.add_option("--thresholds", default="40,60,80",
+                         help="comma separated speeds (km/h) the speeds above are counted (default 40,60,80)")
+    optParser.add_option("--percentiles", default="50,90,95,99",
+                         help="comma separated speed percentiles saved in the .stats.json files (default 50,90,95,99)")
+    options, args = optParser.parse_args()
+    return options
+
+
+def main(workers=None, chunks=1, muid_contains_string=False, mapping_file=None, thresholds=(40, 60, 80),
+         percentiles=(50, 90, 95, 99)):
     """
     The main function.
     Will run through the output folder generating mobcons tracer files to all sumo tracer files
-    :return: None
+    :param workers: the number of processes (default will use the number of cpus, 1 will not start any process)
+    :param chunks: If more than 1 will split each tracer in chunks converted in parallel (one tracer at a time);
+                   If 1 will convert many tracers in parallel
+    :param muid_contains_string: If true will code the string part of the vehicle ids to int (see muid_to_int)
+    :param mapping_file: a json file with the mapping of the coded strings (see StrToInt.save),
+                         it is loaded before and saved after the conversion so ids stay the same in every tracer
+    :param thresholds: the speeds (km/h) the speeds above are counted
+    :param percentiles: the percentiles saved in the .stats.json file of each tracer
+    :return: a dict with the SpeedStatistics of each kind of vehicle merged for all tracers
     """
     import os
 
+    tracerfiles = []
     for root, dirs, files in os.walk(os.path.join(os.getcwd(), "output")):
         for filename in files:
             # Check for sumo tracers without a respective mobcons tracer
             if filename.startswith("tracer") and filename.endswith(".xml") \
                and not os.path.isfile(os.path.join(root, filename[:-3]+"txt")):
-                sumo_tracer_to_mobcons(os.path.join(root, filename))
+                tracerfiles.append(os.path.join(root, filename))
 
+    now = get_start_time()
+    parallel = chunks > 1 or not (workers == 1 or len(tracerfiles) < 2)
 
-if __name__ == '__main__':
-    main()
+    str_to_int = None
+    manager = None
+    if muid_contains_string:
+        if mapping_file is not None and os.path.isfile(mapping_file):
+            str_to_int = StrToInt(mapping_file)
+        else:
+            str_to_int = StrToInt()
+        if parallel:
+            manager = multiprocessing.Manager()
+            str_to_int.share(manager)
+
+    if chunks > 1:
+        statistics_list = [sumo_tracer_to_mobcons_in_chunks(tracerfile, chunks, workers, now, str_to_int=str_to_int,
+                                                            thresholds=thresholds, percentiles=percentiles)
+                           for tracerfile in tracerfiles]
+    elif not parallel:
+        statistics_list = [sumo_tracer_to_mobcons(tracerfile, now=now, str_to_int=str_to_int, thresholds=thresholds,
+                                                  percentiles=percentiles)
+                           for tracerfile in tracerfiles]
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            statistics_list = pool.map(_convert_tracer, [(tracerfile, now, str_to_int, thresholds, percentiles)
+                                                         for tracerfile in tracerfiles])
+        finally:
+            pool.close()
+            pool.join()
+
+        for tracerfile, speed_statistics_by_kind in zip(tracerfiles, statistics_list):
+            print(tracerfile)
+            print_speed_statistics(speed_statistics_by_kind)
+
+    speed_statistics_by_kind = merge_speed_statistics(statistics_list)
+    if len(statistics_list) > 1:
+        print("All tracers:")
+        print_speed_statistics(speed_statistics_by_kind)
 
+    if str_to_int is not None and mapping_file is not None:
+        str_to_int.save(mapping_file)
+    if manager is not None:
+        manager.shutdown()
+
+    return speed_statistics_by_kind
+
+
+if __name__ == '__main__':
+    options = get_options()
+    main(workers=options.workers, chunks=options.chunks, muid_contains_string=options.muid_contains_string,
+         mapping_file=options.id_mapping, thresholds=parse_numbers(options.thresholds),
+         percentiles=parse_numbers(options.percentiles))
@@ -4,8 +4,6 @@ import xml.etree.ElementTree as ET
 import sys
 import optparse
 from datetime import datetime
-from statistics import mean
-import math
 import os
 
 from sumolib import checkBinary
@@ -29,35 +27,47 @@ else:
     sys.exit("please declare environment variable 'SUMO_HOME'")
 
 import traci
+import traci.constants as tc
+
+import numpy as np
+
+import distance_methods
+import util_methods as util
+from fake_traci import ReplayConnection
+from output_methods import ViolationLog
+from profiling_methods import SimulationTimer, run_profiled
+from ConvertTracer import get_start_time
+from metric_methods import DensityCollector, HeadwayCollector, MobconsCollector, SpeedCollector, TimingCollector
+from simulation_methods import ActiveVehicles, Collector, StepPipeline
 
 ######################################################################################
 #################-------- Definition of functions -----------------###################
 ######################################################################################
 
-def distance(x1,y1, x2,y2):
-    """
-    Caculates the distance between the points (x1,y1) and (x1,y2) in the cartesian plane.
-    :param x1: the x position of the first point
-    :param y1: the y position of the first point
-    :param x2: the x position of the second point
-    :param y2: the y position of the second point
-    :return: a float with the distance between the two points
-    """
-    dist = float(((x1-x2)**2)+((y1-y2)**2))
-    return math.sqrt(dist)
-
-
-def get_all_vehicles_active(vehicle_list=[], simulation=traci.simulation):
+def get_all_vehicles_active(vehicle_list=None, simulation=traci.simulation):
     """
     Adds departed cars and removes arrived cars from the list. Needs to be executed at each simulation step.
-    :param vehicle_list: the current list of cars (default create a new list)
+    The cars are kept in the order they departed.
+    :param vehicle_list: the current list of cars or an ActiveVehicles (default create a new list)
     :param simulation: the sumo simulation (default will use the traci.simulation method to get it)
-    :return: the cars list updated
+    :return: the cars list (or the ActiveVehicles) updated
     """
+    if vehicle_list is None:
+        vehicle_list = []
+
+    if isinstance(vehicle_list, ActiveVehicles):
+        for car in simulation.getDepartedIDList():
+            vehicle_list.add(car)
+        for car in simulation.getArrivedIDList():
+            vehicle_list.remove(car)
+        return vehicle_list
+
     for car in simulation.getDepartedIDList():  # Adds the cars that departed in the current step
         vehicle_list.append(car)
 
-    vehicle_list = list(set(vehicle_list) - set(simulation.getArrivedIDList()))  # Removes the cars that arrived in the current step
+    arrived = set(simulation.getArrivedIDList())
+    if arrived:  # Removes the cars that arrived in the current step
+        vehicle_list = [car for car in vehicle_list if car not in arrived]
 
     return vehicle_list
 
@@ -73,84 +83,218 @@ def get_all_vehicles_in_simulation_edge_by_edge(net_file="osm.net.xml"):  # Do n
 
 
 def log_distance_violations(min_dist_bus, min_dist_car, vehicle_list, simulation, distances, use_curr_step=False,
-                            out_file=open("[DISTANCE]" + datetime.now().strftime("%Y-%m-%d %H-%M-%S") + ".txt", "w")):
+                            out_file=None, all_pairs=False, snapshot=None, step=None, net=None):
     """
-    Log distance violations into a text file. Needs to be executed at each simulation step.
+    Log distance violations into a ViolationLog. Needs to be executed at each simulation step.
     :param min_dist_bus: The minimum allowed distance between any vehicle and a bus
     :param min_dist_car: The minimum distance between two passenger cars
     :param vehicle_list: The list of cars currently active
     :param simulation: the sumo simulation
-    :param distances: The log of all distances
+    :param distances: The statistics of all logged distances, a dict in the format {<kind>: RunningStatistics}
     :param use_curr_step: If false will just add distances  to the distances dictionary;
                           If true will also calculate statistics and log then at the current step
-    :param out_file: The file to register distance violations (default will create a new file)
-    :return: The log_file
+    :param out_file: The ViolationLog to register distance violations (default will not register them)
+    :param all_pairs: If false will only compare close vehicles and log the distances that violate the minimum;
+                      If true will compare every pair of vehicles and log all distances (O(n^2))
+    :param snapshot: The VehicleSnapshot of the current step (default will query traci for each vehicle)
+    :param step: The current simulation step, registered with each violation (needed if out_file is set)
+    :param net: If set (a SumoNet) will measure the distances along the lanes instead of in a straight line,
+                comparing only the vehicles on the same lane or on its successors (all_pairs is ignored);
+                the snapshot needs the lane id and lane position variables
+    :return: None
+    """
+    if out_file is not None and step is None:
+        raise ValueError("The step is needed to register the distance violations in out_file")
+    lanes = lane_positions = positions = None
+    if snapshot is not None:
+        vehicle_list = snapshot.ids
+        is_bus = snapshot.type_mask("bus_bus")
+        if net is not None:
+            lanes = snapshot.get(tc.VAR_LANE_ID)
+            lane_positions = snapshot.get(tc.VAR_LANEPOSITION)
+        else:
+            positions = snapshot.positions
+
+    else:
+        if vehicle_list is None:
+            vehicle_list = get_all_vehicles_active(simulation=simulation)
+
+        # Get the type and position of every vehicle only once
+        is_bus = np.array([traci.vehicle.getTypeID(vehicle) == "bus_bus" for vehicle in vehicle_list], dtype=bool)
+        if net is not None:
+            lanes = [traci.vehicle.getLaneID(vehicle) for vehicle in vehicle_list]
+            lane_positions = [traci.vehicle.getLanePosition(vehicle) for vehicle in vehicle_list]
+        else:
+            positions = [traci.vehicle.getPosition(vehicle) for vehicle in vehicle_list]
+
+    violations = distance_methods.step_distances(distances, is_bus, min_dist_bus, min_dist_car, positions, all_pairs,
+                                                 out_file is not None, lanes, lane_positions, net)
+
+    if out_file is not None:
+        for i, j, kind, dist in violations:
+            out_file.log(step, vehicle_list[i], vehicle_list[j], kind, dist)
+
+    if use_curr_step:
+        print_distance_statistics(distances)
+
+
+def print_distance_statistics(distances):
+    """
+    Prints the statistics of the logged distances.
+    :param distances: a dict in the format {<kind>: RunningStatistics}
+    :return: None
     """
-    if not "bus" in distances:
-        distances["bus"] = []
-    if not "car" in distances:
-        distances["car"] = []
     statistics_by_kind = {}
+    for kind in distances.keys():
+        if distances[kind].count > 1:
+            statistics_by_kind[kind] = distances[kind].as_dict()
+    for kind in statistics_by_kind:
+        print('Statistics for ' + kind + str(statistics_by_kind[kind]))
+    print("\n")
 
-    if vehicle_list is None:
-        vehicle_list = get_all_vehicles_active(simulation=simulation)
 
-    # Will get every pair of vehicles currently in the simulation
-    for i in range(len(vehicle_list)):
-        for j in range(i+1, len(vehicle_list)):
-            # Get the vehicle id and type for both vehicles
-            vehicle1 = vehicle_list[i]
-            type1 = traci.vehicle.getTypeID(vehicle1)
-            vehicle2 = vehicle_list[j]
-            type2 = traci.vehicle.getTypeID(vehicle2)
+class DistanceCollector(Collector):
+    """
+    Logs the distance violations at each step of a StepPipeline (see log_distance_violations).
+    """
+    name = "distances"
+    variables = (tc.VAR_POSITION,)
 
-            # Calculate the distance between the 2 vehicles
-            x1, y1 = traci.vehicle.getPosition(vehicle1)
-            x2, y2 = traci.vehicle.getPosition(vehicle2)
-            dist = distance(x1, y1, x2, y2)
+    def __init__(self, min_dist_bus, min_dist_car, all_pairs=False, out_file=None, period=None, net=None):
+        self.min_dist_bus = min_dist_bus
+        self.min_dist_car = min_dist_car
+        self.all_pairs = all_pairs
+        self.out_file = out_file
+        self.period = period
+        self.net = net
+        self.distances = {}
+        if net is not None:
+            self.variables = (tc.VAR_LANE_ID, tc.VAR_LANEPOSITION)
 
-            # Check if one of the vehicles is a bus
-            if "bus_bus" in [type1, type2]:
-                distances["bus"].append(dist)
+    def collect(self, step, snapshot):
+        log_distance_violations(self.min_dist_bus, self.min_dist_car, snapshot.ids, None, self.distances, False,
+                                self.out_file, all_pairs=self.all_pairs, snapshot=snapshot, step=step, net=self.net)
 
-            else:
-                distances["car"].append(dist)
+    def report(self, step):
+        print_distance_statistics(self.distances)
 
-    if use_curr_step:
-        for kind in distances.keys():
-            if len(distances[kind]) > 1:
-                if kind not in statistics_by_kind:
-                    statistics_by_kind[kind] = {}
-                statistics_by_kind[kind]['mean'] = mean(distances[kind])
-                statistics_by_kind[kind]['min'] = min(distances[kind])
-        for kind in statistics_by_kind:
-            print('Statistics for ' + kind + str(statistics_by_kind[kind]))
-        print("\n")
+    def close(self):
+        if self.out_file is not None:
+            self.out_file.close()
+        return dict((kind, self.distances[kind].as_dict(histogram=True)) for kind in self.distances)
 
 
 def get_options():
     optParser = optparse.OptionParser()
     optParser.add_option("--nogui", action="store_true",
                          default=False, help="run the commandline version of sumo")
+    optParser.add_option("--distance-mode", type="choice", choices=["grid", "all-pairs", "lane"], default="grid",
+                         help="grid: only log distance violations between close vehicles (default); "
+                              "all-pairs: log the distance between every pair of vehicles; "
+                              "lane: only compare vehicles on the same or consecutive lanes, along the lanes")
+    optParser.add_option("--violation-log", type="choice", choices=["csv", "binary", "none"], default="csv",
+                         help="the format of the file with every distance violation (default csv)")
+    optParser.add_option("--metrics", default="",
+                         help="comma separated metrics reported with the distances: speed, density, headway")
+    optParser.add_option("--timing", action="store_true", default=False,
+                         help="time each phase of the simulation loop and count the traci calls")
+    optParser.add_option("--profile", type="choice", choices=["none", "cprofile", "pyinstrument"], default="none",
+                         help="run the simulation under a profiler (default none)")
+    optParser.add_option("--output-format", type="choice", choices=["fcd", "mobcons", "both"], default="fcd",
+                         help="write the tracer as sumo fcd output (xml), directly as mobcons tracer (txt) or both "
+                              "(default fcd)")
+    optParser.add_option("--pipelined", action="store_true", default=False,
+                         help="compute the metrics of each step in a worker thread while sumo runs the next steps")
+    optParser.add_option("--replay", metavar="FILE",
+                         help="replay a tracer (fcd output) of a previous simulation instead of running sumo")
     options, args = optParser.parse_args()
     return options
 
 
-def run_simulation():
+def run_simulation(distance_mode="grid", violation_log="csv", connection=traci, output_dir=None,
+                   min_dist_bus=3, min_dist_car=2, report_period=50, metrics=(), timing=False, mobcons_file=None,
+                   now=None, net=None, pipelined=False):
+    """
+    Runs the simulation until there are no more vehicles, logging the distance violations at each step.
+    :param distance_mode: "grid", "all-pairs" or "lane" (see log_distance_violations)
+    :param violation_log: the format of the violations file, "csv", "binary" or "none"
+    :param connection: the traci connection (default will use the traci module)
+    :param output_dir: the directory of the output files (default is the output folder in the current directory)
+    :param min_dist_bus: The minimum allowed distance between any vehicle and a bus
+    :param min_dist_car: The minimum distance between two passenger cars
+    :param report_period: the number of steps between the prints of the statistics (None will not print)
+    :param metrics: the other metrics reported with the distances, a list with "speed", "density" or "headway"
+                    (the speeds are always returned, but only reported if "speed" is in the list)
+    :param timing: If true will time each phase of the loop and count the traci calls, reporting them with the
+                   statistics and saving them in a [TIMING]<time>.json file in output_dir
+    :param mobcons_file: If set will write the mobcons tracer of the simulation in this file (see MobconsCollector)
+    :param now: the timestamp (in ms) of the beginning of the simulation (default will use get_start_time)
+    :param net: the SumoNet used by the lane distance mode (default will load osm.net.xml)
+    :param pipelined: If true will run the metrics in a worker thread while the simulation runs the next steps
+                      (see StepPipeline), the results and reports are the same
+    :return: a dict in the format {"steps": <n_steps>, "distances": {<kind>: <statistics>},
+                                   "violations": {<kind>: <n_violations>}, "speeds": {<kind>: <statistics>}, ...},
+             with speeds in km/h and violations None if they are not logged (violation_log "none"),
+             and the summary of the density, headway and mobcons (speeds by vehicle type) metrics if they are used
+    """
     step = 0
-    vehicle_list = []
-    simulation = traci.simulation
-    distances = {}
-    output_dir = os.path.join(os.getcwd(), "output")
+    if output_dir is None:
+        output_dir = os.path.join(os.getcwd(), "output")
     if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    dis_file_name = "[DISTANCE]"+datetime.now().strftime("%Y-%m-%d_%H-%M-%S")+".txt"
-    dist_out_file = open(os.path.join(output_dir, dis_file_name), "w")
-    while simulation.getMinExpectedNumber() > 0:
-        traci.simulationStep()  # Run a simulation step
-        vehicle_list = get_all_vehicles_active(vehicle_list=vehicle_list, simulation=simulation)
-        log_distance_violations(3, 2, vehicle_list, simulation, distances, (step % 50 == 0), dist_out_file)
-        step += 1
+        os.makedirs(output_dir)
+
+    timer = None
+    if timing:
+        timer = SimulationTimer(connection, report_period)
+        connection = timer.connection  # Counts the traci calls
+    simulation = connection.simulation
+
+    dist_out_file = None
+    if violation_log != "none":
+        dis_file_name = "[DISTANCE]"+datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        dis_file_name += ".bin" if violation_log == "binary" else ".csv"
+        dist_out_file = ViolationLog(os.path.join(output_dir, dis_file_name), binary=(violation_log == "binary"))
+
+    if distance_mode == "lane" and net is None:
+        net = util.load_net("osm.net.xml")
+    collectors = [DistanceCollector(min_dist_bus, min_dist_car, distance_mode == "all-pairs", dist_out_file,
+                                    report_period, net if distance_mode == "lane" else None),
+                  SpeedCollector(report_period if "speed" in metrics else None)]
+    if "density" in metrics:
+        collectors.append(DensityCollector(report_period))
+    if "headway" in metrics:
+        collectors.append(HeadwayCollector(report_period))
+    if mobcons_file is not None:
+        collectors.append(MobconsCollector(mobcons_file, now if now is not None else get_start_time()))
+    if timer is not None and pipelined:
+        # The timing is reported by the worker, in order with the other reports
+        collectors.append(TimingCollector(timer, timer.period))
+        timer.period = None
+    pipeline = StepPipeline(connection, collectors, timer.timers if timer is not None else None, pipelined)
+
+    try:
+        if timer is None:
+            while simulation.getMinExpectedNumber() > 0:
+                connection.simulationStep()  # Run a simulation step
+                pipeline.step(step)  # Read the state of every vehicle once and update every metric
+                step += 1
+        else:
+            simulation_step = timer.timers.phase("simulationStep")
+            while simulation.getMinExpectedNumber() > 0:
+                with simulation_step:
+                    connection.simulationStep()
+                pipeline.step(step)
+                timer.end_step(step)
+                step += 1
+    finally:
+        results = pipeline.close()
+        if timer is not None:
+            timer.dump(os.path.join(output_dir, "[TIMING]"+datetime.now().strftime("%Y-%m-%d_%H-%M-%S")+".json"))
+            results["timing"] = timer.summary()
+
+    results["steps"] = step
+    results["violations"] = dict(dist_out_file.n_violations_by_kind) if dist_out_file is not None else None
+    return results
 
 
 # this is the main entry point of this script
@@ -158,15 +302,33 @@ if __name__ == "__main__":
     options = get_options()
 
     output_file = os.path.join(os.getcwd(), "output", "tracer_"+datetime.now().strftime("%Y-%m-%d_%H-%M-%S")+".xml")
+    mobcons_file = None
+    if options.output_format != "fcd":
+        mobcons_file = output_file[:-3]+"txt"  # The same file ConvertTracer would create from the fcd output
 
     # this script has been called from the command line. It will start sumo as a
     # server, then connect and run
-    if options.nogui:
-        sumoBinary = checkBinary('sumo')
+    if options.replay:
+        connection = ReplayConnection(options.replay)  # Runs offline, without sumo
     else:
-        sumoBinary = checkBinary('sumo-gui')
+        if options.nogui:
+            sumoBinary = checkBinary('sumo')
+        else:
+            sumoBinary = checkBinary('sumo-gui')
 
-    traci.start([sumoBinary, "-c", "osm2.sumocfg",
-                 "--fcd-output", output_file])
+        sumo_cmd = [sumoBinary, "-c", "osm2.sumocfg"]
+        if options.output_format != "mobcons":
+            sumo_cmd += ["--fcd-output", output_file]
+        traci.start(sumo_cmd)
+        connection = traci
 
-    run_simulation()
+    simulation_options = {"distance_mode": options.distance_mode, "violation_log": options.violation_log,
+                          "metrics": [metric for metric in options.metrics.split(",") if metric],
+                          "timing": options.timing, "connection": connection, "mobcons_file": mobcons_file,
+                          "pipelined": options.pipelined}
+    if options.profile == "none":
+        run_simulation(**simulation_options)
+    else:
+        profile_file = os.path.join(os.getcwd(), "output", "[PROFILE]"+datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        profile_file += ".prof" if options.profile == "cprofile" else ".html"
+        run_profiled(run_simulation, options.profile, profile_file, **simulation_options)
@@ -32,17 +32,17 @@ def main():
     mobcons_paths_file = open(os.path.join(os.getcwd(), "output", "mobcons_constraints_" + time_tag + ".json"), "w")
     json_file = open(os.path.join(os.getcwd(), "output", "route_dict_" + time_tag + ".json"), "w")
 
-    # Set the lists
-    vehicle_list, edge_list, point_list = util.set_lists()
-    route_dict = util.generate_route_dict(vehicle_list, edge_list, point_list)
-    paths = util.export_route_dict_to_mobcons_path(route_dict)
+    # The routes are streamed from the route file, the net is loaded from its binary cache when it did not change
+    net = util.load_net()
+    route_dict = util.generate_route_dict(net=net, routes=util.iter_routes())
 
     # Save mobcons path export
-    mobcons_paths_file.writelines(paths)
-    mobcons_paths_file.close()
+    util.write_route_dict_to_mobcons_path(route_dict, mobcons_paths_file, close_after=True)
 
     # Save route dict
     util.save_route_dict_to_json_file(route_dict, json_file, True)
+    columnar_dir = os.path.join(os.getcwd(), "output", "route_dict_" + time_tag)
+    util.save_route_dict_to_columnar(route_dict, columnar_dir)
 
     # Test
     json_file = open(os.path.join(os.getcwd(), "output", "route_dict_" + time_tag + ".json"), "r")
@@ -55,6 +55,15 @@ def main():
         print("Same keys!")
     # I do not test the values because the loaded strings are in unicode
 
+    # The columnar route dict must have the same routes as the json one
+    route_dict3 = util.load_route_dict_from_columnar(columnar_dir)
+    if set(route_dict3.keys()) != keys:
+        print("Not the same key set in the columnar route dict")
+    elif any(route_dict3[vehicle_id] != route_dict2[vehicle_id] for vehicle_id in route_dict2):
+        print("Not the same routes in the columnar route dict")
+    else:
+        print("Same routes in the columnar route dict!")
+
     json_file = open(os.path.join(os.getcwd(), "output", "mobcons_constraints_" + time_tag + ".json"), "r")
     jsonobj = json.loads(json_file.read())
 
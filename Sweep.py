@@ -0,0 +1,195 @@
+from __future__ import print_function
+import multiprocessing
+import optparse
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+# The demand used by build.bat, the sweep changes the period of the passenger cars
+PASSENGER_PERIOD = 2.997417
+BUS_PERIOD = 8.992250
+
+SUMMARY_COLUMNS = ["label", "seed", "period", "min_dist_bus", "min_dist_car", "steps",
+                   "bus_violations", "bus_min_dist", "bus_mean_dist", "car_violations", "car_min_dist", "car_mean_dist",
+                   "bus_mean_speed", "bus_max_speed", "car_mean_speed", "car_max_speed"]
+
+
+def generate_routes(run_dir, seed, period, net_file="osm.net.xml", end=3600):
+    """
+    Generates the passenger and bus routes of a scenario with randomTrips.py (as in build.bat).
+    :param run_dir: the directory where the route files are created
+    :param seed: the random seed
+    :param period: the period between the departures of passenger cars
+    :param net_file: the *.net.xml file
+    :param end: the time of the last departure
+    :return: a list with the *.rou.xml files
+    """
+    random_trips = os.path.join(os.environ["SUMO_HOME"], "tools", "randomTrips.py")
+    route_files = []
+    for name, vehicle_period, prefix, min_distance in (("passenger", period, "veh", 300),
+                                                        ("bus", BUS_PERIOD, "bus", 600)):
+        route_file = os.path.join(run_dir, "osm." + name + ".rou.xml")
+        subprocess.check_call([sys.executable, random_trips, "-n", net_file, "--seed", str(seed),
+                               "--fringe-factor", "5", "-p", str(vehicle_period), "-r", route_file,
+                               "-o", os.path.join(run_dir, "osm." + name + ".trips.xml"), "-e", str(end),
+                               "--vehicle-class", name, "--vclass", name, "--prefix", prefix,
+                               "--min-distance", str(min_distance), "--trip-attributes", "departLane=\"best\"",
+                               "--validate"])
+        route_files.append(route_file)
+    return route_files
+
+
+def run_scenario(run):
+    """
+    Runs one scenario of the sweep with its own labeled traci connection and output directory.
+    :param run: a dict with the label, seed, period, min_dist_bus, min_dist_car, end, output_dir, fake,
+                distance_mode and violation_log of the scenario
+    :return: a dict with the values of SUMMARY_COLUMNS
+    """
+    import Main
+
+    run_dir = run["output_dir"]
+    if not os.path.exists(run_dir):
+        os.makedirs(run_dir)
+
+    if run["fake"]:
+        import fake_traci
+        connection = fake_traci.start(["sumo", "--seed", str(run["seed"]), "--end", str(run["end"])],
+                                      label=run["label"], period=run["period"], bus_period=BUS_PERIOD)
+    else:
+        import traci
+        from sumolib import checkBinary
+
+        route_files = generate_routes(run_dir, run["seed"], run["period"], end=run["end"])
+        traci.start([checkBinary("sumo"), "-c", "osm2.sumocfg", "--route-files", ",".join(route_files),
+                     "--seed", str(run["seed"]), "--fcd-output", os.path.join(run_dir, "tracer.xml")],
+                    label=run["label"])
+        connection = traci.getConnection(run["label"])
+
+    try:
+        result = Main.run_simulation(run["distance_mode"], run["violation_log"], connection, run_dir,
+                                     run["min_dist_bus"], run["min_dist_car"], report_period=None)
+    finally:
+        connection.close()
+
+    row = dict((column, run[column]) for column in SUMMARY_COLUMNS[:5])
+    row["steps"] = result["steps"]
+    for kind in ("bus", "car"):
+        distances = result["distances"].get(kind, {})
+        speeds = result["speeds"].get(kind, {})
+        if result["violations"] is not None:
+            row[kind + "_violations"] = result["violations"][kind]
+        elif run["distance_mode"] != "all-pairs":  # Only the distances of the violations were measured
+            row[kind + "_violations"] = distances.get("count", 0)
+        else:
+            row[kind + "_violations"] = None
+        row[kind + "_min_dist"] = distances.get("min") if distances.get("count") else None
+        row[kind + "_mean_dist"] = distances.get("mean") if distances.get("count") else None
+        row[kind + "_mean_speed"] = speeds.get("mean") if speeds.get("count") else None
+        row[kind + "_max_speed"] = speeds.get("max") if speeds.get("count") else None
+    return row
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "%.3f" % value
+    return str(value)
+
+
+def print_summary(rows, columns=SUMMARY_COLUMNS):
+    """
+    Prints the summary of the sweep as an aligned table.
+    :param rows: a list of dicts returned by run_scenario
+    :param columns: the columns of the table
+    :return: None
+    """
+    table = [columns] + [[format_value(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(value.rjust(width) for value, width in zip(line, widths)))
+
+
+def write_summary(rows, summary_file, columns=SUMMARY_COLUMNS):
+    """
+    Writes the summary of the sweep to a csv file.
+    :param rows: a list of dicts returned by run_scenario
+    :param summary_file: the csv file
+    :param columns: the columns of the csv file
+    :return: None
+    """
+    with open(summary_file, "w") as file:
+        file.write(",".join(columns) + "\n")
+        for row in rows:
+            file.write(",".join("" if row[column] is None else str(row[column]) for column in columns) + "\n")
+
+
+def sweep(seeds=(42,), periods=(PASSENGER_PERIOD,), thresholds=((3, 2),), workers=None, fake=False,
+          output_dir=None, end=3600, distance_mode="grid", violation_log="csv"):
+    """
+    Runs every combination of seed, demand and distance thresholds, each one in a worker process.
+    :param seeds: the random seeds
+    :param periods: the periods between the departures of passenger cars (the demand levels)
+    :param thresholds: a list of tuples in the format (min_dist_bus, min_dist_car)
+    :param workers: the number of processes (default will use the number of cpus)
+    :param fake: If true will use the fake traci (fake_traci.py) instead of sumo
+    :param output_dir: the directory of the sweep (default is output/sweep_<datetime>)
+    :param end: the time of the last departure
+    :param distance_mode: "grid", "all-pairs" or "lane" (see Main.log_distance_violations)
+    :param violation_log: the format of the violations file of each run, "csv", "binary" or "none"
+    :return: a list of dicts with the values of SUMMARY_COLUMNS, one per run
+    """
+    if output_dir is None:
+        output_dir = os.path.join(os.getcwd(), "output", "sweep_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+
+    runs = []
+    for seed in seeds:
+        for period in periods:
+            for min_dist_bus, min_dist_car in thresholds:
+                label = "run" + str(len(runs))
+                runs.append({"label": label, "seed": seed, "period": period, "min_dist_bus": min_dist_bus,
+                             "min_dist_car": min_dist_car, "end": end, "fake": fake,
+                             "output_dir": os.path.join(output_dir, label), "distance_mode": distance_mode,
+                             "violation_log": violation_log})
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        rows = pool.map(run_scenario, runs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    print_summary(rows)
+    write_summary(rows, os.path.join(output_dir, "summary.csv"))
+    return rows
+
+
+def get_options():
+    optParser = optparse.OptionParser()
+    optParser.add_option("--seeds", default="42", help="comma separated random seeds")
+    optParser.add_option("--periods", default=str(PASSENGER_PERIOD),
+                         help="comma separated periods between the departures of passenger cars (the demand levels)")
+    optParser.add_option("--thresholds", default="3:2",
+                         help="comma separated distance thresholds in the format <min_dist_bus>:<min_dist_car>")
+    optParser.add_option("--workers", type="int", default=None,
+                         help="the number of processes (default is the number of cpus)")
+    optParser.add_option("--end", type="float", default=3600, help="the time of the last departure")
+    optParser.add_option("--fake", action="store_true", default=False,
+                         help="use the fake traci stand-in instead of sumo")
+    optParser.add_option("--distance-mode", type="choice", choices=["grid", "all-pairs", "lane"], default="grid",
+                         help="see Main.py --distance-mode")
+    optParser.add_option("--violation-log", type="choice", choices=["csv", "binary", "none"], default="csv",
+                         help="see Main.py --violation-log")
+    options, args = optParser.parse_args()
+    return options
+
+
+if __name__ == '__main__':
+    options = get_options()
+    sweep(seeds=[int(seed) for seed in options.seeds.split(",")],
+          periods=[float(period) for period in options.periods.split(",")],
+          thresholds=[tuple(float(x) for x in threshold.split(":")) for threshold in options.thresholds.split(",")],
+          workers=options.workers, fake=options.fake, end=options.end, distance_mode=options.distance_mode,
+          violation_log=options.violation_log)
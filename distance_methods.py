@@ -0,0 +1,365 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains the functions used to find the pairs of vehicles that are close to each other in the simulation
+-----------------------------------------------------------------------------------------------------------------------
+"""
+import math
+
+import numpy as np
+
+# The cells that come "after" a cell in the grid (including itself), so each pair of cells is only visited once
+_FORWARD_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def distance(x1, y1, x2, y2):
+    """
+    Caculates the distance between the points (x1,y1) and (x1,y2) in the cartesian plane.
+    :param x1: the x position of the first point
+    :param y1: the y position of the first point
+    :param x2: the x position of the second point
+    :param y2: the y position of the second point
+    :return: a float with the distance between the two points
+    """
+    dist = float(((x1-x2)**2)+((y1-y2)**2))
+    return math.sqrt(dist)
+
+
+def all_pairs(positions):
+    """
+    Goes through every pair of positions. This is O(n^2), use grid_pairs when only the close pairs are needed.
+    :param positions: a list of float tuples each in the format (x, y)
+    :return: a generator of tuples in the format (i, j, dist), where i < j are indexes in positions
+    """
+    for i in range(len(positions)):
+        x1, y1 = positions[i]
+        for j in range(i+1, len(positions)):
+            x2, y2 = positions[j]
+            yield i, j, distance(x1, y1, x2, y2)
+
+
+def pair_distances_by_kind(positions, is_bus, block_size=256):
+    """
+    Calculates the distance between every pair of positions with numpy, splitting pairs with and without a bus.
+    The pairs are computed and yielded in blocks of rows, so the memory used is proportional to
+    block_size * len(positions) floats as long as each block is consumed (e.g. by RunningStatistics.update)
+    before the next one.
+    :param positions: an array-like of shape (n, 2) with the (x, y) position of each vehicle
+    :param is_bus: an array-like of n booleans, true if the vehicle is a bus
+    :param block_size: the number of rows computed at once
+    :return: a generator of tuples (bus_distances, car_distances) of numpy arrays, one for each block
+    """
+    xy = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    is_bus = np.asarray(is_bus, dtype=bool)
+
+    for start in range(0, len(xy), block_size):
+        end = min(start + block_size, len(xy))
+
+        # Distances from the vehicles in the block to themselves and to every vehicle after them
+        dists = np.square(xy[start:end, None, 0] - xy[None, start:, 0])
+        dists += np.square(xy[start:end, None, 1] - xy[None, start:, 1])
+        np.sqrt(dists, out=dists)
+
+        # Only keep each pair once (j > i) and check if one of the vehicles is a bus
+        upper = np.arange(len(xy) - start)[None, :] > np.arange(end - start)[:, None]
+        with_bus = is_bus[start:end, None] | is_bus[None, start:]
+        yield dists[upper & with_bus], dists[upper & ~with_bus]
+
+
+def build_grid(positions, cell_size):
+    """
+    Puts each position in a cell of a uniform grid.
+    :param positions: a list of float tuples each in the format (x, y)
+    :param cell_size: the length of the side of each (square) cell
+    :return: a dict in the format {(<cell_x>, <cell_y>): <list_of_indexes_in_positions>}
+    """
+    grid = {}
+    for index, (x, y) in enumerate(positions):
+        cell = (int(math.floor(x / cell_size)), int(math.floor(y / cell_size)))
+        if cell in grid:
+            grid[cell].append(index)
+        else:
+            grid[cell] = [index]
+    return grid
+
+
+def grid_pairs(positions, cell_size):
+    """
+    Goes through the pairs of positions that are closer than cell_size.
+    Only the positions in the same or in neighbour cells of a uniform grid are compared.
+    :param positions: a list of float tuples each in the format (x, y) (or a numpy array of shape (n, 2))
+    :param cell_size: the maximum distance between the two positions of a pair
+    :return: a generator of tuples in the format (i, j, dist), where i < j are indexes in positions
+    """
+    if isinstance(positions, np.ndarray):
+        positions = positions.tolist()  # Indexing python lists one item at a time is much faster
+    grid = build_grid(positions, cell_size)
+
+    for (cell_x, cell_y), members in grid.items():
+        for dx, dy in _FORWARD_CELLS:
+            if dx == 0 and dy == 0:
+                # Pairs inside the cell itself
+                candidates = ((members[a], members[b]) for a in range(len(members))
+                              for b in range(a+1, len(members)))
+            else:
+                neighbours = grid.get((cell_x+dx, cell_y+dy))
+                if neighbours is None:
+                    continue
+                candidates = ((a, b) for a in members for b in neighbours)
+
+            for a, b in candidates:
+                x1, y1 = positions[a]
+                x2, y2 = positions[b]
+                dist = distance(x1, y1, x2, y2)
+                if dist < cell_size:
+                    yield (a, b, dist) if a < b else (b, a, dist)
+
+
+def distance_violations(positions, is_bus, min_dist_bus, min_dist_car):
+    """
+    Finds the pairs of vehicles closer than the minimum distance (uses grid_pairs).
+    :param positions: a list of float tuples each in the format (x, y) (or a numpy array of shape (n, 2))
+    :param is_bus: a list of n booleans, true if the vehicle is a bus
+    :param min_dist_bus: the minimum allowed distance between any vehicle and a bus
+    :param min_dist_car: the minimum distance between two passenger cars
+    :return: a list of tuples in the format (i, j, kind, dist), where kind is "bus" or "car"
+    """
+    violations = []
+    for i, j, dist in grid_pairs(positions, max(min_dist_bus, min_dist_car)):
+        # Check if one of the vehicles is a bus
+        if is_bus[i] or is_bus[j]:
+            if dist < min_dist_bus:
+                violations.append((i, j, "bus", dist))
+
+        elif dist < min_dist_car:
+            violations.append((i, j, "car", dist))
+    return violations
+
+
+def lane_pairs(lanes, lane_positions, max_dist, net=None):
+    """
+    Finds the pairs of vehicles closer than max_dist along their lanes.
+    The vehicles are sorted by lane and position, so the vehicles after each vehicle on the same lane are checked
+    only until they are too far. The vehicles near the end of a lane are also checked with the vehicles at the
+    beginning of the lanes that follow it in the net (the successors), as long as they are closer than max_dist.
+    :param lanes: a list with the lane id of each vehicle
+    :param lane_positions: a list with the position of each vehicle along its lane
+    :param max_dist: the maximum distance between the vehicles of a pair
+    :param net: a SumoNet with the lengths and successors of the lanes (default will only check the same lane)
+    :return: a generator of tuples in the format (i, j, dist), with the indexes of the vehicles, each pair only once
+    """
+    n_vehicles = len(lanes)
+    if n_vehicles < 2:
+        return
+    lanes = np.asarray(lanes, dtype=str)
+    lane_positions = np.asarray(lane_positions, dtype=np.float64)
+    order = np.lexsort((lane_positions, lanes))
+    sorted_lanes = lanes[order]
+    sorted_positions = lane_positions[order]
+
+    # Vehicles on the same lane, comparing each vehicle with the k-th next one while any pair is close enough
+    k = 1
+    while k < n_vehicles:
+        gaps = sorted_positions[k:] - sorted_positions[:-k]
+        close = (sorted_lanes[k:] == sorted_lanes[:-k]) & (gaps < max_dist)
+        if not close.any():
+            break
+        for index in np.flatnonzero(close).tolist():
+            yield int(order[index]), int(order[index + k]), float(gaps[index])
+        k += 1
+
+    if net is None:
+        return
+
+    # The first index of each lane in the sorted vehicles
+    lane_ids, lane_starts, lane_counts = np.unique(sorted_lanes, return_index=True, return_counts=True)
+    vehicles_on_lane = dict((lane_id, (start, start + count)) for lane_id, start, count
+                            in zip(lane_ids.tolist(), lane_starts.tolist(), lane_counts.tolist()))
+    sorted_positions = sorted_positions.tolist()
+
+    # Two lanes may reach each other (loops through the internal lanes of a junction), so the same pair can be
+    # found from both vehicles, only the shortest distance is kept
+    cross_lane_pairs = {}  # {(<i>, <j>): <dist>} with i < j
+    for lane_id, (start, end) in vehicles_on_lane.items():
+        length = net.lane_length(lane_id)
+        if length is None or length - sorted_positions[end - 1] >= max_dist or not net.successors.get(lane_id):
+            continue
+        reachable = _reachable_lanes(net, lane_id, max_dist)
+        for index in range(end - 1, start - 1, -1):  # The vehicles closest to the end of the lane first
+            to_end = length - sorted_positions[index]
+            if to_end >= max_dist:
+                break
+            for successor, offset in reachable.items():
+                if successor not in vehicles_on_lane:
+                    continue
+                successor_start, successor_end = vehicles_on_lane[successor]
+                for other in range(successor_start, successor_end):
+                    dist = to_end + offset + sorted_positions[other]
+                    if dist >= max_dist:
+                        break
+                    pair = (min(order[index], order[other]), max(order[index], order[other]))
+                    if dist < cross_lane_pairs.get(pair, max_dist):
+                        cross_lane_pairs[pair] = dist
+
+    for (i, j), dist in cross_lane_pairs.items():
+        yield int(i), int(j), dist
+
+
+def _reachable_lanes(net, lane_id, max_dist):
+    """
+    :return: a dict in the format {<lane_id>: <distance_from_the_end_of_the_lane>} with the lanes that start less
+             than max_dist after the end of the lane (the shortest distance if there are many ways)
+    """
+    import heapq
+
+    reachable = {}
+    heap = [(0.0, successor) for successor in net.successors.get(lane_id, ())]
+    while heap:
+        offset, successor = heapq.heappop(heap)
+        if successor in reachable or successor == lane_id:
+            continue
+        reachable[successor] = offset
+        length = net.lane_length(successor)
+        if length is not None and offset + length < max_dist:
+            for next_lane in net.successors.get(successor, ()):
+                heapq.heappush(heap, (offset + length, next_lane))
+    return reachable
+
+
+def lane_violations(lanes, lane_positions, is_bus, min_dist_bus, min_dist_car, net=None):
+    """
+    Finds the pairs of vehicles closer than the minimum distance along their lanes (uses lane_pairs).
+    :param lanes: a list with the lane id of each vehicle
+    :param lane_positions: a list with the position of each vehicle along its lane
+    :param is_bus: a list of n booleans, true if the vehicle is a bus
+    :param min_dist_bus: the minimum allowed distance between any vehicle and a bus
+    :param min_dist_car: the minimum distance between two passenger cars
+    :param net: a SumoNet with the lengths and successors of the lanes (default will only check the same lane)
+    :return: a list of tuples in the format (i, j, kind, dist), where kind is "bus" or "car"
+    """
+    violations = []
+    for i, j, dist in lane_pairs(lanes, lane_positions, max(min_dist_bus, min_dist_car), net):
+        if is_bus[i] or is_bus[j]:
+            if dist < min_dist_bus:
+                violations.append((i, j, "bus", dist))
+
+        elif dist < min_dist_car:
+            violations.append((i, j, "car", dist))
+    return violations
+
+
+def step_distances(distances, is_bus, min_dist_bus, min_dist_car, positions=None, all_pairs=False,
+                   violations_needed=True, lanes=None, lane_positions=None, net=None):
+    """
+    Measures the distances of one simulation step and adds them to the statistics (see Main.log_distance_violations).
+    :param distances: The statistics of all logged distances, a dict in the format {<kind>: RunningStatistics}
+    :param is_bus: an array-like of n booleans, true if the vehicle is a bus
+    :param min_dist_bus: The minimum allowed distance between any vehicle and a bus
+    :param min_dist_car: The minimum distance between two passenger cars
+    :param positions: an array-like of shape (n, 2) with the (x, y) position of each vehicle (not needed with net)
+    :param all_pairs: If false will only compare close vehicles and add the distances that violate the minimum;
+                      If true will compare every pair of vehicles and add all distances (O(n^2))
+    :param violations_needed: If false the violations are not searched in the all pairs mode
+    :param lanes: the lane id of each vehicle (only needed with net)
+    :param lane_positions: the position of each vehicle along its lane (only needed with net)
+    :param net: If set (a SumoNet) will measure the distances along the lanes instead of in a straight line,
+                comparing only the vehicles on the same lane or on its successors (all_pairs is ignored)
+    :return: a list of the violations in the format (i, j, kind, dist), where i < j are indexes of the vehicles
+    """
+    if not "bus" in distances:
+        distances["bus"] = RunningStatistics()
+    if not "car" in distances:
+        distances["car"] = RunningStatistics()
+
+    # Will get only the pairs of vehicles that may be violating one of the minimum distances
+    violations = []
+    if net is not None:
+        all_pairs = False
+        violations = lane_violations(lanes, lane_positions, is_bus, min_dist_bus, min_dist_car, net)
+    elif violations_needed or not all_pairs:
+        violations = distance_violations(positions, is_bus, min_dist_bus, min_dist_car)
+
+    if all_pairs:
+        # Will get the distance of every pair of vehicles currently in the simulation, one block at a time
+        for bus_distances, car_distances in pair_distances_by_kind(positions, is_bus):
+            distances["bus"].update(bus_distances)
+            distances["car"].update(car_distances)
+
+    else:
+        distances["bus"].update([dist for _, _, kind, dist in violations if kind == "bus"])
+        distances["car"].update([dist for _, _, kind, dist in violations if kind == "car"])
+    return violations
+
+
+class RunningStatistics:
+    """
+    Keeps the statistics of a stream of values without storing the values.
+    The variance uses the Welford/Chan algorithm, so it stays precise even after a long simulation.
+    The histogram has one bin for each interval of bin_edges, the last bin counts the values >= bin_edges[-1].
+    """
+    def __init__(self, bin_edges=range(0, 101)):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of the squared differences from the mean
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.histogram = np.zeros(len(self.bin_edges), dtype=np.int64)
+
+    def update(self, values):
+        """
+        Adds a batch of values to the statistics.
+        :param values: an array-like of numbers
+        :return: None
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+
+        count = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        self._combine(count, values.sum(), values.min(), values.max(), mean, m2)
+
+        bins = np.searchsorted(self.bin_edges, values, side="right") - 1
+        self.histogram += np.bincount(np.clip(bins, 0, len(self.bin_edges) - 1), minlength=len(self.bin_edges))
+
+    def merge(self, other):
+        """
+        Adds the values of another RunningStatistics (with the same bin_edges) to this one.
+        :param other: a RunningStatistics
+        :return: None
+        """
+        if other.count == 0:
+            return
+        self._combine(other.count, other.sum, other.min, other.max, other.mean, other._m2)
+        self.histogram += other.histogram
+
+    def _combine(self, count, total, minimum, maximum, mean, m2):
+        new_count = self.count + count
+        delta = mean - self.mean
+        self._m2 += float(m2) + delta ** 2 * self.count * count / new_count
+        self.mean += float(delta) * count / new_count
+        self.count = new_count
+        self.sum += float(total)
+        self.min = min(self.min, float(minimum))
+        self.max = max(self.max, float(maximum))
+
+    @property
+    def variance(self):
+        """
+        :return: the sample variance of the values (0 if there are less than 2 values)
+        """
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_dict(self, histogram=False):
+        """
+        :param histogram: If true will add the bin_edges and the histogram (the count of values in each bin)
+        :return: a dict with the count, mean, min, max and standard deviation of the values
+        """
+        statistics = {'count': self.count, 'mean': float(self.mean), 'min': self.min, 'max': self.max,
+                      'std': math.sqrt(self.variance)}
+        if histogram:
+            statistics['bin_edges'] = self.bin_edges.tolist()
+            statistics['histogram'] = self.histogram.tolist()
+        return statistics
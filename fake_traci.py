@@ -0,0 +1,301 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains a stand-in for the traci module that does not need sumo, used to test the simulation scripts.
+FakeConnection generates vehicles that depart at a fixed period and move in random walks.
+ReplayConnection replays a sumo tracer (fcd output) recorded by a previous simulation.
+-----------------------------------------------------------------------------------------------------------------------
+"""
+import random
+
+import traci.constants as tc
+from traci.exceptions import TraCIException
+
+from ConvertTracer import iter_timesteps
+
+_connections = {}
+
+
+class _FakeVehicle:
+    def __init__(self, vehicle_id, vehicle_type, x, y, speed, arrival):
+        self.id = vehicle_id
+        self.type = vehicle_type
+        self.x = x
+        self.y = y
+        self.speed = speed
+        self.arrival = arrival
+
+    def value(self, variable):
+        if variable == tc.VAR_POSITION:
+            return self.x, self.y
+        if variable == tc.VAR_SPEED:
+            return self.speed
+        if variable == tc.VAR_TYPE:
+            return self.type
+        # The area is split in 100 m x 100 m squares, each one is an edge with a single lane along x
+        if variable == tc.VAR_ROAD_ID:
+            return "e" + str(int(self.x // 100)) + "_" + str(int(self.y // 100))
+        if variable == tc.VAR_LANE_ID:
+            return self.value(tc.VAR_ROAD_ID) + "_0"
+        if variable == tc.VAR_LANEPOSITION:
+            return self.x % 100
+        raise TraCIException("Variable " + hex(variable) + " is not supported by the fake traci")
+
+
+class FakeSimulationDomain:
+    """
+    The simulation domain (traci.simulation) of a FakeConnection.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getMinExpectedNumber(self):
+        return self._connection.min_expected_number()
+
+    def getDepartedIDList(self):
+        return list(self._connection.departed)
+
+    def getArrivedIDList(self):
+        return list(self._connection.arrived)
+
+    def getTime(self):
+        return float(self._connection.time)
+
+    def getDeltaT(self):
+        return float(self._connection.step_length)
+
+
+class FakeVehicleDomain:
+    """
+    The vehicle domain (traci.vehicle) of a FakeConnection.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+        self._subscriptions = {}  # {<vehicle_id>: <list_of_variables>}
+
+    def _get(self, vehicle_id):
+        if vehicle_id not in self._connection.vehicles:
+            raise TraCIException("Vehicle '" + vehicle_id + "' is not known")
+        return self._connection.vehicles[vehicle_id]
+
+    def getIDList(self):
+        return list(self._connection.vehicles)
+
+    def getTypeID(self, vehicle_id):
+        return self._get(vehicle_id).type
+
+    def getPosition(self, vehicle_id):
+        return self._get(vehicle_id).value(tc.VAR_POSITION)
+
+    def getSpeed(self, vehicle_id):
+        return self._get(vehicle_id).speed
+
+    def subscribe(self, vehicle_id, varIDs=(tc.VAR_ROAD_ID, tc.VAR_LANEPOSITION), begin=None, end=None):
+        self._get(vehicle_id)
+        self._subscriptions[vehicle_id] = list(varIDs)
+
+    def getSubscriptionResults(self, vehicle_id):
+        vehicle = self._get(vehicle_id)
+        return dict((variable, vehicle.value(variable)) for variable in self._subscriptions.get(vehicle_id, []))
+
+    def getAllSubscriptionResults(self):
+        # The subscriptions of arrived vehicles are dropped, as in sumo
+        for vehicle_id in list(self._subscriptions):
+            if vehicle_id not in self._connection.vehicles:
+                del self._subscriptions[vehicle_id]
+        return dict((vehicle_id, self.getSubscriptionResults(vehicle_id)) for vehicle_id in self._subscriptions)
+
+
+class FakeConnection:
+    """
+    A stand-in for a traci connection (the object returned by traci.getConnection).
+    A passenger car departs every period seconds and a bus every bus_period seconds until end,
+    each vehicle moves in a random walk inside a square area and arrives after its trip duration.
+    The same seed always generates the same simulation.
+    """
+    def __init__(self, seed=42, period=3.0, bus_period=9.0, end=3600, area=2000.0, trip_duration=(60, 600),
+                 step_length=1.0):
+        self.random = random.Random(seed)
+        self.period = period
+        self.bus_period = bus_period
+        self.end = end
+        self.area = area
+        self.trip_duration = trip_duration
+        self.step_length = step_length
+
+        self.step = 0
+        self.time = 0.0
+        self.vehicles = {}  # The vehicles currently in the simulation in the order they departed
+        self.departed = []
+        self.arrived = []
+        self._next_departure = {"veh": 0.0, "bus": 0.0}
+        self._n_departed = {"veh": 0, "bus": 0}
+
+        self.simulation = FakeSimulationDomain(self)
+        self.vehicle = FakeVehicleDomain(self)
+
+    def min_expected_number(self):
+        pending = any(self._next_departure[prefix] < self.end for prefix in self._next_departure)
+        return len(self.vehicles) + (1 if pending else 0)
+
+    def simulationStep(self, step=0.):
+        self.step += 1
+        time = self.time = self.step * self.step_length
+        self.departed = []
+        self.arrived = []
+
+        for vehicle_id in list(self.vehicles):
+            vehicle = self.vehicles[vehicle_id]
+            if vehicle.arrival <= time:
+                del self.vehicles[vehicle_id]
+                self.arrived.append(vehicle_id)
+                continue
+
+            # Random walk, bouncing back at the borders of the area
+            vehicle.speed = min(max(vehicle.speed + self.random.uniform(-1.5, 1.5), 0.0), 25.0)
+            vehicle.x = min(max(vehicle.x + self.random.uniform(-1, 1) * vehicle.speed * self.step_length, 0.0),
+                            self.area)
+            vehicle.y = min(max(vehicle.y + self.random.uniform(-1, 1) * vehicle.speed * self.step_length, 0.0),
+                            self.area)
+
+        for prefix, period, vehicle_type in (("veh", self.period, "veh_passenger"),
+                                             ("bus", self.bus_period, "bus_bus")):
+            while self._next_departure[prefix] < min(time, self.end):
+                vehicle_id = prefix + str(self._n_departed[prefix])
+                self.vehicles[vehicle_id] = _FakeVehicle(vehicle_id, vehicle_type,
+                                                         self.random.uniform(0, self.area),
+                                                         self.random.uniform(0, self.area),
+                                                         self.random.uniform(0, 15.0),
+                                                         time + self.random.randint(*self.trip_duration))
+                self.departed.append(vehicle_id)
+                self._n_departed[prefix] += 1
+                self._next_departure[prefix] += period
+
+    def close(self, wait=True):
+        for label in [label for label in _connections if _connections[label] is self]:
+            del _connections[label]
+
+
+class _ReplayVehicle:
+    def __init__(self, vehicle_id, attributes):
+        self.id = vehicle_id
+        self.type = attributes.get("type")
+        self.speed = float(attributes.get("speed", 0.0))
+        self.attributes = attributes
+
+    def value(self, variable):
+        attributes = self.attributes
+        if variable == tc.VAR_POSITION:
+            return float(attributes["x"]), float(attributes["y"])
+        if variable == tc.VAR_SPEED:
+            return self.speed
+        if variable == tc.VAR_TYPE:
+            return self.type
+        if variable == tc.VAR_LANE_ID:
+            return attributes.get("lane", "")
+        if variable == tc.VAR_ROAD_ID:
+            return attributes.get("lane", "").rsplit("_", 1)[0]
+        if variable == tc.VAR_LANEPOSITION:
+            return float(attributes.get("pos", 0.0))
+        raise TraCIException("Variable " + hex(variable) + " is not in the replayed tracer")
+
+
+class ReplayConnection:
+    """
+    A stand-in for a traci connection that replays a sumo tracer (the --fcd-output of a simulation).
+    Each simulationStep reads the next timestep of the tracer, the vehicles that appear in a timestep departed
+    and the vehicles that disappear arrived. As in sumo, getTime is the time after the step: the time of the
+    timestep in the tracer (the time before the step) plus the step length (the time between the timesteps).
+    The tracer is parsed incrementally (see ConvertTracer.iter_timesteps), so the memory does not grow with the
+    tracer and the steps run as fast as the file can be parsed.
+    The tracer needs the x, y, speed and type attributes (lane and pos for the lane variables).
+    """
+    def __init__(self, tracerfile):
+        """
+        :param tracerfile: the sumo tracer file
+        """
+        self.tracerfile = tracerfile
+        self._timesteps = iter_timesteps(tracerfile)
+        self._next = self._read_timestep()  # The next timestep is read ahead to know if the replay ended
+
+        self.step = 0
+        self.time = 0.0
+        self.step_length = 1.0
+        self.vehicles = {}  # The vehicles currently in the simulation in the order they departed
+        self.departed = []
+        self.arrived = []
+
+        self.simulation = FakeSimulationDomain(self)
+        self.vehicle = FakeVehicleDomain(self)
+
+    def _read_timestep(self):
+        # The attributes are copied because the timestep Element is cleared after it is read
+        for timestep in self._timesteps:
+            return float(timestep.get("time")), [(vehicle.get("id"), dict(vehicle.attrib)) for vehicle in timestep
+                                                 if vehicle.tag == "vehicle"]
+        return None
+
+    def min_expected_number(self):
+        return len(self.vehicles) + (1 if self._next is not None else 0)
+
+    def simulationStep(self, step=0.):
+        self.departed = []
+        self.arrived = []
+        if self._next is None:
+            self.arrived = list(self.vehicles)
+            self.vehicles = {}
+            self.time += self.step_length
+            return
+        self.step += 1
+        timestep_time, vehicle_list = self._next
+        self._next = self._read_timestep()
+        if self._next is not None:
+            self.step_length = self._next[0] - timestep_time
+        self.time = timestep_time + self.step_length
+
+        vehicles = {}
+        for vehicle_id, attributes in vehicle_list:
+            vehicles[vehicle_id] = _ReplayVehicle(vehicle_id, attributes)
+            if vehicle_id not in self.vehicles:
+                self.departed.append(vehicle_id)
+        self.arrived = [vehicle_id for vehicle_id in self.vehicles if vehicle_id not in vehicles]
+
+        # Keeps the vehicles in the order they departed
+        for vehicle_id in self.vehicles:
+            if vehicle_id in vehicles:
+                self.vehicles[vehicle_id] = vehicles[vehicle_id]
+        for vehicle_id in self.arrived:
+            del self.vehicles[vehicle_id]
+        for vehicle_id in self.departed:
+            self.vehicles[vehicle_id] = vehicles[vehicle_id]
+
+    def close(self, wait=True):
+        self._timesteps.close()
+
+
+def start(cmd, label="default", **kwargs):
+    """
+    Starts a fake simulation, as traci.start.
+    The --seed and --end options of cmd are used, other sumo options are ignored.
+    :param cmd: the sumo command line
+    :param label: the label of the connection
+    :param kwargs: the arguments of FakeConnection (period, bus_period, ...)
+    :return: the FakeConnection
+    """
+    for option, name, parse in (("--seed", "seed", int), ("--end", "end", float)):
+        if option in cmd and name not in kwargs:
+            kwargs[name] = parse(cmd[cmd.index(option) + 1])
+    if label in _connections:
+        raise TraCIException("Connection '" + label + "' is already active.")
+    _connections[label] = FakeConnection(**kwargs)
+    return _connections[label]
+
+
+def getConnection(label="default"):
+    """
+    Gets a fake connection started with start, as traci.getConnection.
+    :param label: the label of the connection
+    :return: the FakeConnection
+    """
+    if label not in _connections:
+        raise TraCIException("Connection '" + label + "' is not known.")
+    return _connections[label]
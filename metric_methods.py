@@ -0,0 +1,201 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains the collectors (see simulation_methods.StepPipeline) of the metrics computed during a simulation
+-----------------------------------------------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+
+import numpy as np
+import traci.constants as tc
+
+from ConvertTracer import SpeedStatistics, muid_to_int, save_speed_statistics
+from distance_methods import RunningStatistics
+from output_methods import BackgroundWriter
+from simulation_methods import Collector
+
+
+class SpeedCollector(Collector):
+    """
+    The statistics of the speeds (km/h) of the buses and of the other vehicles.
+    """
+    name = "speeds"
+    variables = (tc.VAR_SPEED,)
+
+    def __init__(self, period=None, bus_type="bus_bus"):
+        self.period = period
+        self.bus_type = bus_type
+        self.speeds = {"bus": RunningStatistics(range(0, 141, 5)), "car": RunningStatistics(range(0, 141, 5))}
+
+    def collect(self, step, snapshot):
+        is_bus = snapshot.type_mask(self.bus_type)
+        speeds_kmh = snapshot.speeds * 3.6
+        self.speeds["bus"].update(speeds_kmh[is_bus])
+        self.speeds["car"].update(speeds_kmh[~is_bus])
+
+    def report(self, step):
+        for kind in self.speeds:
+            if self.speeds[kind].count > 0:
+                print('Speed statistics for ' + kind + str(self.speeds[kind].as_dict()))
+
+    def close(self):
+        return dict((kind, self.speeds[kind].as_dict(histogram=True)) for kind in self.speeds)
+
+
+class DensityCollector(Collector):
+    """
+    The statistics of the number of vehicles on each occupied edge at each step.
+    If the length of the edges is given the density is in vehicles per km instead.
+    """
+    name = "density"
+    variables = (tc.VAR_ROAD_ID,)
+
+    def __init__(self, period=None, edge_lengths=None):
+        """
+        :param period: the number of steps between the reports
+        :param edge_lengths: a dict in the format {<edge_id>: <length_in_m>} (default will count the vehicles)
+        """
+        self.period = period
+        self.edge_lengths = edge_lengths
+        self.density = RunningStatistics(range(0, 201, 5))
+        self.max_edge = None
+
+    def collect(self, step, snapshot):
+        edges = snapshot.get(tc.VAR_ROAD_ID)
+        if not edges:
+            return
+        edge_ids, counts = np.unique(np.array(edges, dtype=str), return_counts=True)
+        density = counts.astype(np.float64)
+        if self.edge_lengths is not None:
+            lengths = np.array([self.edge_lengths.get(edge_id, 0.0) for edge_id in edge_ids.tolist()])
+            known = lengths > 0  # The internal edges of the junctions may not have a length
+            density = density[known] * 1000.0 / lengths[known]
+            edge_ids = edge_ids[known]
+        if len(density) == 0:
+            return
+        if density.max() > self.density.max:
+            self.max_edge = str(edge_ids[density.argmax()])
+        self.density.update(density)
+
+    def report(self, step):
+        if self.density.count > 0:
+            print('Density statistics' + str(self.density.as_dict()) + ' max at edge ' + str(self.max_edge))
+
+    def close(self):
+        summary = self.density.as_dict(histogram=True)
+        summary["max_edge"] = self.max_edge
+        return summary
+
+
+class HeadwayCollector(Collector):
+    """
+    The statistics of the time headway (s) between consecutive vehicles on the same lane.
+    The headway is the gap to the leader (difference of the lane positions) divided by the speed of the follower.
+    """
+    name = "headway"
+    variables = (tc.VAR_LANE_ID, tc.VAR_LANEPOSITION, tc.VAR_SPEED)
+
+    def __init__(self, period=None, min_speed=0.1):
+        """
+        :param period: the number of steps between the reports
+        :param min_speed: the followers slower than this (m/s) are ignored, their headway is not defined
+        """
+        self.period = period
+        self.min_speed = min_speed
+        self.headway = RunningStatistics(range(0, 61))
+
+    def collect(self, step, snapshot):
+        if len(snapshot.ids) < 2:
+            return
+        lanes = np.array(snapshot.get(tc.VAR_LANE_ID), dtype=str)
+        positions = np.array(snapshot.get(tc.VAR_LANEPOSITION), dtype=np.float64)
+        speeds = snapshot.speeds
+
+        # Sorts the vehicles by lane and then by position, so each leader comes right after its follower
+        order = np.lexsort((positions, lanes))
+        same_lane = lanes[order][1:] == lanes[order][:-1]
+        gaps = positions[order][1:] - positions[order][:-1]
+        follower_speeds = speeds[order][:-1]
+        valid = same_lane & (follower_speeds > self.min_speed)
+        self.headway.update(gaps[valid] / follower_speeds[valid])
+
+    def report(self, step):
+        if self.headway.count > 0:
+            print('Headway statistics' + str(self.headway.as_dict()))
+
+    def close(self):
+        return self.headway.as_dict(histogram=True)
+
+
+class MobconsCollector(Collector):
+    """
+    Writes the mobcons tracer lines (id,x,y,speed_kmh,timestamp,type) of every vehicle at each step,
+    the same lines ConvertTracer writes from the fcd output, without writing and parsing the xml.
+    The speed statistics of each vehicle type are computed on the fly (see ConvertTracer.SpeedStatistics)
+    and saved in <mobcons_file>.stats.json at the end.
+    """
+    name = "mobcons"
+    variables = (tc.VAR_POSITION, tc.VAR_SPEED)
+    needs_time = True
+
+    def __init__(self, mobcons_file, now, str_to_int=None, thresholds=(40, 60, 80), percentiles=(50, 90, 95, 99),
+                 batch_size=100000, max_batches=4):
+        """
+        :param mobcons_file: the mobcons tracer file that will be created (*.txt)
+        :param now: the timestamp (in ms) of the beginning of the simulation (see ConvertTracer.get_start_time)
+        :param str_to_int: If set will code the string parts of the vehicle ids to int with it (see muid_to_int)
+        :param thresholds: the speeds (km/h) the speeds above are counted
+        :param percentiles: the percentiles saved with the speed statistics
+        :param batch_size: the number of lines handed to the background writer at once (as the buffer_lines of
+                           ConvertTracer.convert_timesteps)
+        :param max_batches: the number of batches waiting to be written before the simulation is blocked
+        """
+        self.mobcons_file = mobcons_file
+        self.now = now
+        self.str_to_int = str_to_int
+        self.thresholds = thresholds
+        self.percentiles = percentiles
+        self.speed_statistics_by_kind = {}
+        self.writer = BackgroundWriter(mobcons_file, "".join, batch_size=batch_size, max_batches=max_batches)
+
+    def collect(self, step, snapshot):
+        vehicle_ids = snapshot.ids
+        if not vehicle_ids:
+            return
+        # The time of the fcd timestep is the time before the step (getTime is after it), written with 2 decimals
+        timestamp = str(self.now + int(float("%.2f" % (snapshot.time - snapshot.step_length)) * 1000))
+        types = snapshot.types
+        # The fcd output has 2 decimal places, the speeds are rounded as ConvertTracer does
+        positions = np.round(snapshot.positions, 2).tolist()
+        speeds = np.round(np.round(snapshot.speeds, 2) * 3.6, 3)
+
+        if self.str_to_int is not None:
+            vehicle_ids = [muid_to_int(vehicle_id, self.str_to_int) for vehicle_id in vehicle_ids]
+        lines = ["%s,%.2f,%.2f,%s,%s,%s\n" % (vehicle_id, xy[0], xy[1], speed, timestamp, vehicle_type)
+                 for vehicle_id, xy, speed, vehicle_type in zip(vehicle_ids, positions, speeds.tolist(), types)]
+        self.writer.write_many(lines)
+
+        for vehicle_type in set(types):
+            if vehicle_type not in self.speed_statistics_by_kind:
+                self.speed_statistics_by_kind[vehicle_type] = SpeedStatistics(self.thresholds)
+            self.speed_statistics_by_kind[vehicle_type].add_array(speeds[snapshot.type_mask(vehicle_type)])
+
+    def close(self):
+        self.writer.close()
+        save_speed_statistics(self.speed_statistics_by_kind, self.mobcons_file[:-3] + "stats.json",
+                              self.percentiles)
+        return dict((kind, self.speed_statistics_by_kind[kind].as_dict()) for kind in self.speed_statistics_by_kind)
+
+
+class TimingCollector(Collector):
+    """
+    Prints the report of a profiling_methods.SimulationTimer, used when the collectors run in a worker thread
+    so the timing reports come in order with the reports of the other collectors.
+    """
+    name = "timing"
+
+    def __init__(self, timer, period=None):
+        self.timer = timer
+        self.period = period
+
+    def report(self, step):
+        self.timer.report()
@@ -0,0 +1,220 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains the classes used to write the outputs of a simulation without blocking the simulation loop
+-----------------------------------------------------------------------------------------------------------------------
+"""
+import json
+import struct
+import threading
+from queue import Queue
+
+
+class BackgroundWorker:
+    """
+    Runs a function on each item put in a bounded queue, in a background thread.
+    The first error of the function stops the processing of the next items and is raised again in the caller
+    thread by the next put or by close.
+    """
+    def __init__(self, function, max_pending=256):
+        """
+        :param function: the function called with each item
+        :param max_pending: the number of items waiting for the thread before put is blocked
+        """
+        self.function = function
+        self.error = None
+        self._queue = Queue(max_pending)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self.function(item)
+                except Exception as error:  # It is raised again in the caller thread
+                    self.error = error
+
+    def put(self, item):
+        """
+        Hands an item to the background thread, blocks while max_pending items are waiting.
+        :param item: the argument of the function (not None)
+        :return: None
+        """
+        if self.error is not None:
+            raise self.error
+        self._queue.put(item)
+
+    def close(self):
+        """
+        Waits for the items still in the queue and stops the background thread.
+        :return: None
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            raise self.error
+
+
+class BackgroundWriter:
+    """
+    Writes batches of records to a file in a background thread.
+    The records are added to a batch and the full batches are handed to the thread through a bounded queue,
+    so the caller only waits for the disk when the thread is more than max_batches behind.
+    """
+    def __init__(self, file_name, encode, binary=False, header=None, batch_size=4096, max_batches=256):
+        """
+        :param file_name: the file that will be created
+        :param encode: a function that turns a list of records into a string (or bytes if binary)
+        :param binary: If true will open the file in binary mode
+        :param header: a string (or bytes) written at the beginning of the file
+        :param batch_size: the number of records in each batch
+        :param max_batches: the number of batches waiting to be written before the caller is blocked
+        """
+        self.file = open(file_name, "wb" if binary else "w")
+        self.encode = encode
+        self.batch_size = batch_size
+        self.batch = []
+        if header:
+            self.file.write(header)
+        self._worker = BackgroundWorker(self._write_batch, max_batches)
+
+    def _write_batch(self, batch):
+        self.file.write(self.encode(batch))
+
+    def write(self, record):
+        """
+        Adds a record to be written.
+        :param record: a record accepted by the encode function
+        :return: None
+        """
+        self.batch.append(record)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records):
+        """
+        Adds many records to be written, the batch is handed to the thread once it has batch_size records or more.
+        :param records: a list of records accepted by the encode function
+        :return: None
+        """
+        self.batch += records
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands the current batch to the background thread.
+        :return: None
+        """
+        if self.batch:
+            self._worker.put(self.batch)
+            self.batch = []
+
+    def close(self):
+        """
+        Writes the remaining records, waits for the background thread and closes the file.
+        :return: None
+        """
+        self.flush()
+        try:
+            self._worker.close()
+        finally:
+            self.file.close()
+
+
+class ViolationLog:
+    """
+    Records each distance violation as (step, vehicle1, vehicle2, kind, distance).
+    The records are written by a BackgroundWriter in a csv file or in a compact binary file.
+    The binary file has one RECORD per violation with the vehicles as indexes in a table of ids,
+    the table is saved at the end in <file_name>.ids.json together with the KINDS.
+    """
+    RECORD = struct.Struct("<iiiBf")  # step, vehicle1, vehicle2, kind (index in KINDS), distance
+    KINDS = ("bus", "car")
+
+    def __init__(self, file_name, binary=False, batch_size=4096):
+        """
+        :param file_name: the file that will be created
+        :param binary: If true will write binary records, if false will write csv lines
+        :param batch_size: the number of records handed to the background thread at once
+        """
+        self.file_name = file_name
+        self.binary = binary
+        self.vehicle_index = {}  # {<vehicle_id>: <index_in_the_table>} only used by the binary format
+        self.kind_index = dict((kind, index) for index, kind in enumerate(self.KINDS))
+        self.n_violations = 0
+        self.n_violations_by_kind = dict((kind, 0) for kind in self.KINDS)
+
+        if binary:
+            self.writer = BackgroundWriter(file_name, self._encode_binary, True, batch_size=batch_size)
+        else:
+            self.writer = BackgroundWriter(file_name, self._encode_csv, header="step,vehicle1,vehicle2,kind,distance\n",
+                                           batch_size=batch_size)
+
+    def _encode_csv(self, batch):
+        return "".join(["%d,%s,%s,%s,%.3f\n" % record for record in batch])
+
+    def _encode_binary(self, batch):
+        return b"".join([self.RECORD.pack(*record) for record in batch])
+
+    def _vehicle_to_int(self, vehicle_id):
+        index = self.vehicle_index.get(vehicle_id)
+        if index is None:
+            index = len(self.vehicle_index)
+            self.vehicle_index[vehicle_id] = index
+        return index
+
+    def log(self, step, vehicle1, vehicle2, kind, dist):
+        """
+        Records a distance violation.
+        :param step: the simulation step
+        :param vehicle1: the id of the first vehicle
+        :param vehicle2: the id of the second vehicle
+        :param kind: "bus" if one of the vehicles is a bus, "car" otherwise
+        :param dist: the distance between the vehicles
+        :return: None
+        """
+        if self.binary:
+            self.writer.write((step, self._vehicle_to_int(vehicle1), self._vehicle_to_int(vehicle2),
+                               self.kind_index[kind], dist))
+        else:
+            self.writer.write((step, vehicle1, vehicle2, kind, dist))
+        self.n_violations += 1
+        self.n_violations_by_kind[kind] += 1
+
+    def close(self):
+        """
+        Writes the remaining violations and closes the file (and saves the id table of the binary format).
+        :return: None
+        """
+        self.writer.close()
+        if self.binary:
+            with open(self.file_name + ".ids.json", "w") as ids_file:
+                json.dump({"vehicles": sorted(self.vehicle_index, key=self.vehicle_index.get),
+                           "kinds": list(self.KINDS)}, ids_file)
+
+
+def read_violation_log(file_name):
+    """
+    Reads the violations of a binary ViolationLog.
+    :param file_name: the binary file
+    :return: a generator of tuples in the format (step, vehicle1, vehicle2, kind, distance)
+    """
+    with open(file_name + ".ids.json", "r") as ids_file:
+        table = json.load(ids_file)
+    vehicles = table["vehicles"]
+    kinds = table["kinds"]
+
+    with open(file_name, "rb") as file:
+        while True:
+            data = file.read(ViolationLog.RECORD.size * 4096)
+            if not data:
+                break
+            for step, vehicle1, vehicle2, kind, dist in ViolationLog.RECORD.iter_unpack(data):
+                yield step, vehicles[vehicle1], vehicles[vehicle2], kinds[kind], dist
@@ -0,0 +1,245 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains the timers, the traci call counters and the profilers used to find where a simulation spends time
+-----------------------------------------------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import json
+import sys
+import threading
+import time
+
+
+class _Phase:
+    """
+    The context manager returned by PhaseTimers.phase, adds the time spent inside the with block to its phase.
+    """
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timers.totals[self.name] += time.perf_counter() - self.start
+        self.timers.counts[self.name] += 1
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class PhaseTimers:
+    """
+    Accumulates the time (perf_counter) spent in each phase of the simulation loop:
+
+        with timers.phase("distances"):
+            ...
+    """
+    enabled = True
+
+    def __init__(self):
+        self.totals = {}  # {<phase>: <seconds>} in the order the phases were first timed
+        self.counts = {}  # {<phase>: <number_of_times_timed>}
+        self.lock = threading.Lock()  # Held while a phase is added, so another thread can copy the dicts
+        self._phases = {}
+
+    def phase(self, name):
+        """
+        :param name: the name of the phase
+        :return: a context manager that times its with block
+        """
+        phase = self._phases.get(name)
+        if phase is None:
+            with self.lock:
+                phase = self._phases[name] = _Phase(self, name)
+                self.totals[name] = 0.0
+                self.counts[name] = 0
+        return phase
+
+
+class NullTimers:
+    """
+    The PhaseTimers used when the timing is disabled, each phase is a shared context manager that does nothing.
+    """
+    enabled = False
+    _phase = _NullPhase()
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def phase(self, name):
+        return self._phase
+
+
+class _CountingDomain:
+    """
+    Wraps a traci domain (traci.vehicle, traci.simulation...), counting the calls of each of its functions.
+    """
+    def __init__(self, domain, domain_name, calls, lock):
+        self._domain = domain
+        self._domain_name = domain_name
+        self._calls = calls
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attribute = getattr(self._domain, name)
+        if not callable(attribute):
+            return attribute
+        call_name = self._domain_name + "." + name
+        calls = self._calls
+        with self._lock:
+            calls.setdefault(call_name, 0)
+
+        def counted(*args, **kwargs):
+            calls[call_name] += 1
+            return attribute(*args, **kwargs)
+        setattr(self, name, counted)  # The next accesses will not pass through __getattr__
+        return counted
+
+
+class CountingConnection:
+    """
+    Wraps a traci connection (or the traci module itself), counting the calls of simulationStep and of the
+    functions of the simulation and vehicle domains. Every other attribute is taken from the connection.
+    """
+    def __init__(self, connection):
+        """
+        :param connection: the traci connection
+        """
+        self.connection = connection
+        self.calls = {"simulationStep": 0}  # {<domain.function>: <number_of_calls>}
+        self.lock = threading.Lock()  # Held while a function is added, so another thread can copy the calls
+        self.simulation = _CountingDomain(connection.simulation, "simulation", self.calls, self.lock)
+        self.vehicle = _CountingDomain(connection.vehicle, "vehicle", self.calls, self.lock)
+
+    def simulationStep(self, step=0.):
+        self.calls["simulationStep"] += 1
+        return self.connection.simulationStep(step)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class SimulationTimer:
+    """
+    The per phase timers and the traci call counters of a simulation loop.
+    Every period steps prints a report with the time of each phase and the traci calls per step,
+    the same numbers can be saved in a json file at the end of the simulation.
+    """
+    def __init__(self, connection, period=None):
+        """
+        :param connection: the traci connection, the calls made through self.connection are counted
+        :param period: the number of steps between the reports (None will never report)
+        """
+        self.connection = CountingConnection(connection)
+        self.timers = PhaseTimers()
+        self.period = period
+        self.steps = 0
+        self.start = time.perf_counter()
+
+    def end_step(self, step):
+        """
+        Needs to be executed at the end of each simulation step.
+        :param step: the simulation step
+        :return: None
+        """
+        self.steps += 1
+        if self.period is not None and step % self.period == 0:
+            self.report()
+
+    def summary(self):
+        """
+        :return: a dict in the format {"steps": <n_steps>, "wall_time": <seconds>,
+                                       "phases": {<phase>: {"total": <seconds>, "per_step": <ms>, "share": <%>}},
+                                       "traci_calls": {<function>: {"total": <calls>, "per_step": <calls>}}}
+        It can be called from another thread (see metric_methods.TimingCollector) while the simulation runs.
+        """
+        # The simulation thread adds a key the first time a phase is timed or a traci function is called
+        with self.timers.lock:
+            totals = list(self.timers.totals.items())
+        with self.connection.lock:
+            calls = list(self.connection.calls.items())
+        wall_time = time.perf_counter() - self.start
+        steps = max(self.steps, 1)
+        phases = {}
+        for name, total in totals:
+            phases[name] = {"total": total, "per_step": 1000.0 * total / steps,
+                            "share": 100.0 * total / wall_time if wall_time > 0 else 0.0}
+        traci_calls = {}
+        for name, total in calls:
+            traci_calls[name] = {"total": total, "per_step": float(total) / steps}
+        return {"steps": self.steps, "wall_time": wall_time, "phases": phases, "traci_calls": traci_calls}
+
+    def report(self):
+        """
+        Prints the time of each phase and the traci calls per step.
+        :return: None
+        """
+        summary = self.summary()
+        print("Timing after " + str(summary["steps"]) + " steps (" + "%.2fs" % summary["wall_time"] + ")")
+        for name, phase in summary["phases"].items():
+            print("  " + name + ": " + "%.3f ms/step" % phase["per_step"] + " (" + "%.1f%%" % phase["share"] + ")")
+        n_calls = sum(calls["per_step"] for calls in summary["traci_calls"].values())
+        print("  traci calls: " + "%.1f/step" % n_calls)
+        print("\n")
+
+    def dump(self, file_name):
+        """
+        Saves the summary in a json file.
+        :param file_name: the json file
+        :return: None
+        """
+        with open(file_name, "w") as out_file:
+            json.dump(self.summary(), out_file, indent=2)
+
+
+def run_profiled(function, profiler, out_file, *args, **kwargs):
+    """
+    Runs a function under cProfile or pyinstrument.
+    The cProfile stats are saved in out_file (see the pstats module) and the 20 functions with the most cumulative
+    time are printed, pyinstrument saves a html report in out_file and prints the call tree.
+    :param function: the function to profile
+    :param profiler: "cprofile" or "pyinstrument"
+    :param out_file: the file where the profile is saved
+    :param args: the arguments of the function
+    :param kwargs: the keyword arguments of the function
+    :return: what the function returns
+    """
+    if profiler == "cprofile":
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            profile.dump_stats(out_file)
+            pstats.Stats(profile).sort_stats("cumulative").print_stats(20)
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            sys.exit("please install pyinstrument to use it as profiler (pip install pyinstrument)")
+
+        profile = Profiler()
+        profile.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.stop()
+            with open(out_file, "w") as html_file:
+                html_file.write(profile.output_html())
+            print(profile.output_text())
+
+    raise ValueError("Unknown profiler '" + str(profiler) + "'")
@@ -0,0 +1,388 @@
+"""
+-----------------------------------------------------------------------------------------------------------------------
+This file contains the classes used to read the state of the vehicles from a running (traci) simulation
+-----------------------------------------------------------------------------------------------------------------------
+"""
+import numpy as np
+import traci.constants as tc
+
+from output_methods import BackgroundWorker
+from profiling_methods import NullTimers
+
+
+class ActiveVehicles:
+    """
+    Keeps the vehicles currently in the simulation, in the order they departed.
+    Adding or removing a vehicle is O(1), the list of ids is only rebuilt in the steps when some vehicle departed
+    or arrived. Each vehicle has a slot in the arrays of cached attributes (type, position and speed), the slots
+    of arrived vehicles are reused by the next vehicles.
+    """
+    def __init__(self, capacity=1024):
+        """
+        :param capacity: the initial size of the arrays, they grow when there are more vehicles
+        """
+        self.slot_by_vehicle = {}  # {<vehicle_id>: <slot>} in the order the vehicles departed
+        self.type_table = []  # The vehicle types, each slot keeps the index of its type in this list
+        self._type_codes = {}
+        self._free_slots = []
+        self._n_slots = 0
+        self.type_code = np.zeros(capacity, dtype=np.int32)
+        self.xy = np.zeros((capacity, 2), dtype=np.float64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self._ids = []
+        self._slots = np.zeros(0, dtype=np.int64)
+        self._changed = False
+
+    def add(self, vehicle_id, vehicle_type=None):
+        """
+        Adds a departed vehicle.
+        :param vehicle_id: the id of the vehicle
+        :param vehicle_type: the type of the vehicle
+        :return: the slot of the vehicle
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self._n_slots
+            self._n_slots += 1
+            if slot >= len(self.type_code):
+                self._grow()
+
+        if vehicle_type not in self._type_codes:
+            self._type_codes[vehicle_type] = len(self.type_table)
+            self.type_table.append(vehicle_type)
+        self.type_code[slot] = self._type_codes[vehicle_type]
+
+        self.slot_by_vehicle[vehicle_id] = slot
+        self._changed = True
+        return slot
+
+    def remove(self, vehicle_id):
+        """
+        Removes an arrived vehicle (does nothing if the vehicle is not active).
+        :param vehicle_id: the id of the vehicle
+        :return: None
+        """
+        slot = self.slot_by_vehicle.pop(vehicle_id, None)
+        if slot is not None:
+            self._free_slots.append(slot)
+            self._changed = True
+
+    def _grow(self):
+        capacity = 2 * len(self.type_code)
+        self.type_code = np.resize(self.type_code, capacity)
+        self.xy = np.resize(self.xy, (capacity, 2))
+        self.speed = np.resize(self.speed, capacity)
+
+    def _update_order(self):
+        if self._changed:
+            self._ids = list(self.slot_by_vehicle)
+            self._slots = np.fromiter(self.slot_by_vehicle.values(), dtype=np.int64, count=len(self.slot_by_vehicle))
+            self._changed = False
+
+    @property
+    def ids(self):
+        """
+        :return: a list with the ids of the active vehicles in the order they departed (do not change it)
+        """
+        self._update_order()
+        return self._ids
+
+    @property
+    def slots(self):
+        """
+        :return: a numpy array with the slots of the active vehicles in the same order as ids
+        """
+        self._update_order()
+        return self._slots
+
+    def type_of(self, vehicle_id):
+        """
+        :param vehicle_id: the id of an active vehicle
+        :return: the type of the vehicle
+        """
+        return self.type_table[self.type_code[self.slot_by_vehicle[vehicle_id]]]
+
+    def type_mask(self, vehicle_type):
+        """
+        :param vehicle_type: a vehicle type
+        :return: a numpy array of booleans, true if the vehicle is of the type, in the same order as ids
+        """
+        if vehicle_type not in self._type_codes:
+            return np.zeros(len(self.slot_by_vehicle), dtype=bool)
+        return self.type_code[self.slots] == self._type_codes[vehicle_type]
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self.slot_by_vehicle
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.slot_by_vehicle)
+
+
+class VehicleSnapshot:
+    """
+    Keeps the state of every active vehicle at the current simulation step.
+    The variables are read with one traci subscription per vehicle, so each vehicle is queried once per step.
+    The type of each vehicle never changes, so it is only queried once when the vehicle departs.
+    The position, speed and type of the vehicles are kept in the arrays of an ActiveVehicles.
+    """
+    def __init__(self, connection, variables=(tc.VAR_POSITION, tc.VAR_SPEED)):
+        """
+        :param connection: the traci connection (or the traci module itself)
+        :param variables: the traci vehicle variables (from traci.constants) read at each step
+        """
+        self.connection = connection
+        self.variables = list(variables)
+        self.vehicles = ActiveVehicles()
+        self.results = {}
+        self._time = None
+        self._step_length = None
+
+    def update(self):
+        """
+        Reads the state of the vehicles at the current step. Needs to be executed after each simulation step.
+        :return: None
+        """
+        simulation = self.connection.simulation
+        vehicle = self.connection.vehicle
+
+        departed = simulation.getDepartedIDList()
+        arrived = simulation.getArrivedIDList()
+        if departed and arrived:
+            # A vehicle that departed and arrived in the same step no longer exists, so it can not be queried
+            arrived_now = set(arrived)
+            departed = [vehicle_id for vehicle_id in departed if vehicle_id not in arrived_now]
+
+        for vehicle_id in departed:  # Subscribes the vehicles that departed in the current step
+            vehicle.subscribe(vehicle_id, self.variables)
+            self.vehicles.add(vehicle_id, vehicle.getTypeID(vehicle_id))
+
+        for vehicle_id in arrived:  # The subscriptions of arrived vehicles are dropped by sumo
+            self.vehicles.remove(vehicle_id)
+
+        self.results = vehicle.getAllSubscriptionResults()
+        self._time = None
+
+        # Copies the position and speed of each vehicle to its slot
+        xy = self.vehicles.xy
+        speed = self.vehicles.speed
+        has_position = tc.VAR_POSITION in self.variables
+        has_speed = tc.VAR_SPEED in self.variables
+        for vehicle_id, slot in self.vehicles.slot_by_vehicle.items():
+            result = self.results.get(vehicle_id)
+            if result is not None:
+                if has_position:
+                    xy[slot] = result[tc.VAR_POSITION]
+                if has_speed:
+                    speed[slot] = result[tc.VAR_SPEED]
+
+    @property
+    def time(self):
+        """
+        :return: the simulation time (s) of the current step, only queried the first time it is used in a step
+        """
+        if self._time is None:
+            self._time = self.connection.simulation.getTime()
+        return self._time
+
+    @property
+    def step_length(self):
+        """
+        :return: the length (s) of the simulation steps, only queried the first time it is used
+        """
+        if self._step_length is None:
+            self._step_length = self.connection.simulation.getDeltaT()
+        return self._step_length
+
+    @property
+    def ids(self):
+        """
+        :return: a list with the ids of the active vehicles in the order they departed
+        """
+        return self.vehicles.ids
+
+    @property
+    def types(self):
+        """
+        :return: a list with the type of each vehicle in the same order as self.ids
+        """
+        type_table = self.vehicles.type_table
+        return [type_table[code] for code in self.vehicles.type_code[self.vehicles.slots].tolist()]
+
+    def type_mask(self, vehicle_type):
+        """
+        :param vehicle_type: a vehicle type
+        :return: a numpy array of booleans, true if the vehicle is of the type, in the same order as self.ids
+        """
+        return self.vehicles.type_mask(vehicle_type)
+
+    def get(self, variable):
+        """
+        Gets the value of one variable for every active vehicle.
+        :param variable: a traci vehicle variable (from traci.constants) given to the constructor
+        :return: a list with the values in the same order as self.ids
+        """
+        return [self.results[vehicle_id][variable] for vehicle_id in self.ids]
+
+    @property
+    def positions(self):
+        """
+        :return: a numpy array of shape (n, 2) with the (x, y) of each vehicle in the same order as self.ids
+        """
+        return self.vehicles.xy[self.vehicles.slots]
+
+    @property
+    def speeds(self):
+        """
+        :return: a numpy array with the speed (m/s) of each vehicle in the same order as self.ids
+        """
+        return self.vehicles.speed[self.vehicles.slots]
+
+    def freeze(self, with_time=False):
+        """
+        Copies the state of the vehicles at the current step, so it can be used after the next update.
+        :param with_time: If true will also copy the time and the step length (querying them if needed)
+        :return: a FrozenSnapshot
+        """
+        return FrozenSnapshot(self, with_time)
+
+
+class FrozenSnapshot:
+    """
+    A copy of a VehicleSnapshot at one step, with the same interface (but without the traci connection).
+    Used to analyse a step in another thread while the simulation runs the next one.
+    """
+    connection = None
+
+    def __init__(self, snapshot, with_time=False):
+        """
+        :param snapshot: a VehicleSnapshot updated at the current step
+        :param with_time: If true will copy the time and the step length (otherwise they are None)
+        """
+        vehicles = snapshot.vehicles
+        self.time = snapshot.time if with_time else None
+        self.step_length = snapshot.step_length if with_time else None
+        self.ids = list(vehicles.ids)
+        self.results = dict(snapshot.results)  # traci builds new result dicts at each step
+        self._type_table = list(vehicles.type_table)
+        self._type_codes = vehicles.type_code[vehicles.slots]
+        self.positions = vehicles.xy[vehicles.slots]
+        self.speeds = vehicles.speed[vehicles.slots]
+
+    @property
+    def types(self):
+        return [self._type_table[code] for code in self._type_codes.tolist()]
+
+    def type_mask(self, vehicle_type):
+        if vehicle_type not in self._type_table:
+            return np.zeros(len(self.ids), dtype=bool)
+        return self._type_codes == self._type_table.index(vehicle_type)
+
+    def get(self, variable):
+        return [self.results[vehicle_id][variable] for vehicle_id in self.ids]
+
+
+class Collector:
+    """
+    A metric computed at each step of a StepPipeline.
+    The subclasses set the traci vehicle variables they need and the number of steps between their reports.
+    """
+    name = "collector"
+    variables = ()  # The traci vehicle variables (from traci.constants) read by the collector
+    period = None  # The number of steps between the reports (None will never report)
+    needs_time = False  # If true the snapshot time is used, so the pipelined snapshots copy it
+
+    def collect(self, step, snapshot):
+        """
+        Updates the metric with the state of the vehicles at the current step.
+        :param step: the simulation step
+        :param snapshot: the VehicleSnapshot of the step, with every variable needed by the collectors
+        :return: None
+        """
+        pass
+
+    def report(self, step):
+        """
+        Reports (prints) the metric, called after collect every period steps.
+        :param step: the simulation step
+        :return: None
+        """
+        pass
+
+    def close(self):
+        """
+        Called at the end of the simulation.
+        :return: the summary of the metric
+        """
+        return None
+
+
+class StepPipeline:
+    """
+    Runs many collectors at each simulation step with only one read of the vehicles state.
+    The variables needed by all collectors are combined in a single subscription per vehicle,
+    so every collector shares the same VehicleSnapshot instead of querying traci itself.
+    """
+    def __init__(self, connection, collectors, timers=None, pipelined=False, max_pending=16):
+        """
+        :param connection: the traci connection (or the traci module itself)
+        :param collectors: a list of Collector
+        :param timers: the PhaseTimers of the snapshot update and of each collector (default will not time them)
+        :param pipelined: If true will run the collectors in a worker thread, with a copy of the snapshot of each step
+                          (see FrozenSnapshot), so the analysis of a step overlaps the next simulation steps;
+                          the steps are still collected and reported one at a time and in order
+        :param max_pending: the number of steps waiting for the worker before the simulation is blocked
+        """
+        self.collectors = list(collectors)
+        self.timers = timers if timers is not None else NullTimers()
+        self._needs_time = any(collector.needs_time for collector in self.collectors)
+        self._worker = BackgroundWorker(self._collect_item, max_pending) if pipelined else None
+
+        # The position and speed are always read because they are kept in the ActiveVehicles arrays
+        variables = [tc.VAR_POSITION, tc.VAR_SPEED]
+        for collector in self.collectors:
+            variables += [variable for variable in collector.variables if variable not in variables]
+        self.snapshot = VehicleSnapshot(connection, variables)
+
+    def step(self, step):
+        """
+        Reads the state of the vehicles and runs the collectors. Needs to be executed after each simulation step.
+        :param step: the simulation step
+        :return: None
+        """
+        with self.timers.phase("snapshot"):
+            self.snapshot.update()
+        if self._worker is None:
+            self._collect(step, self.snapshot)
+            return
+
+        with self.timers.phase("freeze"):
+            frozen = self.snapshot.freeze(self._needs_time)
+        self._worker.put((step, frozen))  # Blocks while the worker is max_pending steps behind
+
+    def _collect(self, step, snapshot):
+        timers = self.timers
+        for collector in self.collectors:
+            with timers.phase(collector.name):
+                collector.collect(step, snapshot)
+            if collector.period is not None and step % collector.period == 0:
+                with timers.phase("report"):
+                    collector.report(step)
+
+    def _collect_item(self, item):
+        self._collect(*item)
+
+    def close(self):
+        """
+        Waits for the steps still in the worker (if pipelined) and closes the collectors.
+        :return: a dict in the format {<collector_name>: <summary>}
+        """
+        try:
+            if self._worker is not None:
+                self._worker.close()  # Raises the first error of the collectors in the worker
+        finally:
+            summaries = dict((collector.name, collector.close()) for collector in self.collectors)
+        return summaries
@@ -5,18 +5,28 @@ This file contains some functions that may be useful to multiple applications th
 """
 
 
-def set_lists(vehicle_list=[], edge_list=[], point_list=[], route_files=["osm.bus.rou.xml"], net_file="osm.net.xml"):
+def set_lists(vehicle_list=None, edge_list=None, point_list=None, route_files=None, net_file="osm.net.xml"):
     """
     Sets the lists using information from sumo input files.
-    :param vehicle_list: the list that will be set with all vehicles in the route files
-    :param point_list: the list that will be set with all junctions in the net file
-    :param edge_list:  the list that will be set will all edge in the net file
-    :param route_files: a list with *.rou.xml files
-    :param net_file: a list with *.net.xml files
-    :return: None
+    :param vehicle_list: the list that will be set with all vehicles in the route files (default is a new list)
+    :param point_list: the list that will be set with all junctions in the net file (default is a new list)
+    :param edge_list:  the list that will be set will all edge in the net file (default is a new list)
+    :param route_files: a list with *.rou.xml files (default is ["osm.bus.rou.xml"])
+    :param net_file: a *.net.xml file (None will not set the point and edge lists, see load_net)
+    :return: a tuple (vehicle_list, edge_list, point_list)
     """
     import xml.etree.ElementTree as ET
 
+    # The lists are created at each call, so the vehicles of a call are not added to the lists of the next one
+    if vehicle_list is None:
+        vehicle_list = []
+    if edge_list is None:
+        edge_list = []
+    if point_list is None:
+        point_list = []
+    if route_files is None:
+        route_files = ["osm.bus.rou.xml"]
+
     for route_file in route_files:
         # We are accessing this xml as a tree structure
         xml_file = ET.parse(route_file)
@@ -25,6 +35,9 @@ def set_lists(vehicle_list=[], edge_list=[], point_list=[], route_files=["osm.bu
         # Get the vehicle routes definitions from the file
         vehicle_list += [x for x in xml_root if x.tag == "vehicle"]
 
+    if net_file is None:
+        return vehicle_list, edge_list, point_list
+
     # Doing the same for the point and edge lists
     xml_file = ET.parse(net_file)
     xml_root = xml_file.getroot()
@@ -33,76 +46,437 @@ def set_lists(vehicle_list=[], edge_list=[], point_list=[], route_files=["osm.bu
     return vehicle_list, edge_list, point_list
 
 
-def get_xy_from_point(point_list, point_id):
+def _chosen_route(distribution):
     """
-    Gets the xy position for a point in the sumo net
-    :param point_list: a list with all the points (generated using the set_lists function)
-    :param point_id: the id of the point
-    :return: a float tuple in the format (x, y)
+    :param distribution: a routeDistribution Element (as in the *.rou.alt.xml files)
+    :return: the route Element chosen by the router (the one at the index of the "last" attribute)
     """
-    import xml.etree.ElementTree as ET
+    routes = [x for x in distribution if x.tag == "route"]
+    if not routes:
+        return None
+    index = int(distribution.get("last", 0))
+    return routes[index] if 0 <= index < len(routes) else routes[-1]
 
-    for point in point_list:
-        if point.get("id") == point_id:
-            xy = (float(point.get("x")), float(point.get("y")))
-            return xy
 
-
-def edge_to_xy_list(edge_list, point_list, edge_id):
+def iter_routes(route_files=None, id_prefix=None, depart_begin=None, depart_end=None):
     """
-    Produces an xy list from the edge shape in the sumo net
-    :param edge_list: a list with all the edges (generated using the set_lists function)
-    :param point_list: a list with all the points (generated using the set_lists function)
-    :param edge_id: the id of the edge
-    :return: a list of float tuples each in the format (x, y)
+    Goes through the vehicles of route files without keeping the files in memory.
+    Reads *.rou.xml and *.rou.alt.xml files, the route of a vehicle can be in the vehicle, in a routeDistribution
+    (the route chosen by the router is used) or in a route element (or routeDistribution) defined before it.
+    :param route_files: a list with *.rou.xml or *.rou.alt.xml files (default is ["osm.bus.rou.xml"])
+    :param id_prefix: If set will only yield the vehicles whose id starts with it (a string or a tuple of strings)
+    :param depart_begin: If set will only yield the vehicles that depart at or after it (s)
+    :param depart_end: If set will only yield the vehicles that depart before it (s)
+    :return: a generator of tuples in the format (vehicle_id, vehicle_type, depart, <list_of_edges>),
+             depart is None if it is not a number (as "triggered")
     """
     import xml.etree.ElementTree as ET
-    from math import ceil
 
-    xy_list = []
-    for edge in edge_list:
-        if edge.get("id") == edge_id:
+    if route_files is None:
+        route_files = ["osm.bus.rou.xml"]
+    filter_depart = depart_begin is not None or depart_end is not None
+
+    for route_file in route_files:
+        named_routes = {}  # {<route_id>: <list_of_edges>} of the routes defined outside of the vehicles
+        depth = 0
+        context = ET.iterparse(route_file, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 0:  # Only the children of the root are handled, with their whole subtree
+                continue
+
+            if elem.tag in ("route", "routeDistribution") and elem.get("id") is not None:
+                route = elem if elem.tag == "route" else _chosen_route(elem)
+                if route is not None:
+                    named_routes[elem.get("id")] = route.get("edges").split(" ")
+
+            elif elem.tag == "vehicle":
+                vehicle_id = elem.get("id")
+                try:
+                    depart = float(elem.get("depart"))
+                except (TypeError, ValueError):
+                    depart = None
+
+                if (id_prefix is None or vehicle_id.startswith(id_prefix)) and \
+                   (not filter_depart or (depart is not None and
+                                          (depart_begin is None or depart >= depart_begin) and
+                                          (depart_end is None or depart < depart_end))):
+                    edges = None
+                    for sub_elm in elem:
+                        route = sub_elm if sub_elm.tag == "route" else \
+                            _chosen_route(sub_elm) if sub_elm.tag == "routeDistribution" else None
+                        if route is not None:
+                            edges = route.get("edges").split(" ")
+                            break
+                    if edges is None and elem.get("route") in named_routes:
+                        edges = named_routes[elem.get("route")]
+                    if edges is not None:
+                        yield vehicle_id, elem.get("type"), depart, edges
+
+            root.clear()  # Drops the elements already processed, so memory does not grow with the file
+
+
+def alt_route_files(directory="reroute_files"):
+    """
+    :param directory: a directory with the outputs of the router
+    :return: a sorted list with the *.rou.alt.xml files of the directory
+    """
+    import os
 
-            # First we add the position of the starting point
-            if "from" in edge.attrib:
-                xy_list.append(get_xy_from_point(point_list, edge.get("from")))
+    return sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                  if file_name.endswith(".rou.alt.xml"))
+
+
+class SumoNet:
+    """
+    Indexes the junctions and edges of a sumo net by their ids, so each lookup is a dict access.
+    The xy list of each edge is only built the first time the edge is used and then kept in a cache,
+    the cache can be bounded (least recently used edges are dropped first) for very large nets.
+    The parsed net can be saved to a binary (numpy .npz) file that loads much faster than the xml (see load_net).
+    """
+    CACHE_VERSION = 3
+
+    def __init__(self, edge_list=(), point_list=(), cache_size=None, connection_list=()):
+        """
+        :param edge_list: a list with all the edges (generated using the set_lists function)
+        :param point_list: a list with all the points (generated using the set_lists function)
+        :param cache_size: the maximum number of edge xy lists kept in the cache (default is unbounded)
+        :param connection_list: a list with all the connections of the net (the lane successors)
+        """
+        from collections import OrderedDict
+        from math import ceil
+
+        self.junctions = {}  # {<junction_id>: (x, y)}
+        self.edges = {}  # {<edge_id>: (<from_junction_id>, <to_junction_id>, <shape>)}
+        self.lanes = {}  # {<lane_id>: (<edge_id>, <length>, <shape>)}
+        self.successors = {}  # {<lane_id>: <list_of_lane_ids>} the lanes a vehicle can go to at the end of a lane
+        self.cache_size = cache_size
+        self._xy_cache = OrderedDict()  # {<edge_id>: <tuple_of_xy>} in the order the edges were last used
+
+        for point in point_list:
+            self.junctions[point.get("id")] = (float(point.get("x")), float(point.get("y")))
+
+        # The shapes are kept as strings and only parsed when they are used
+        for edge in edge_list:
+            lanes = [x for x in edge if x.tag == "lane"]
+            for lane in lanes:
+                self.lanes[lane.get("id")] = (edge.get("id"), float(lane.get("length")), lane.get("shape"))
 
             # If the edge has a shape we will use it
             if "shape" in edge.attrib:
-                shape = edge.get("shape").split(" ")
+                shape = edge.get("shape")
 
             # Otherwise we will just use the shape of the edge's middle lane
             else:
-                lanes = [x for x in edge if x.tag == "lane"]
                 mid_lane = lanes[int(ceil(len(lanes)/2.0))-1]
-                shape = mid_lane.get("shape").split(" ")
+                shape = mid_lane.get("shape")
+
+            self.edges[edge.get("id")] = (edge.get("from"), edge.get("to"), shape)
+
+        # A connection goes through its internal lane (via) if it has one, the internal lanes have their own connection
+        for connection in connection_list:
+            from_lane = connection.get("from") + "_" + connection.get("fromLane")
+            to_lane = connection.get("via") or connection.get("to") + "_" + connection.get("toLane")
+            self.successors.setdefault(from_lane, []).append(to_lane)
+
+    def lane_length(self, lane_id):
+        """
+        :param lane_id: the id of the lane
+        :return: the length of the lane or None if there is no such lane
+        """
+        lane = self.lanes.get(lane_id)
+        return None if lane is None else lane[1]
+
+    @classmethod
+    def from_file(cls, net_file="osm.net.xml", cache_size=None):
+        """
+        Parses a sumo net file.
+        :param net_file: a *.net.xml file
+        :param cache_size: the maximum number of edge xy lists kept in the cache (default is unbounded)
+        :return: a SumoNet
+        """
+        import xml.etree.ElementTree as ET
+
+        xml_root = ET.parse(net_file).getroot()
+        return cls([x for x in xml_root if x.tag == "edge"], [x for x in xml_root if x.tag == "junction"],
+                   cache_size, [x for x in xml_root if x.tag == "connection"])
+
+    @classmethod
+    def from_cache(cls, cache_file, cache_size=None):
+        """
+        Loads a net saved with SumoNet.save_cache.
+        :param cache_file: a .npz file
+        :param cache_size: the maximum number of edge xy lists kept in the cache (default is unbounded)
+        :return: a SumoNet
+        """
+        import numpy as np
+
+        net = cls(cache_size=cache_size)
+        with np.load(cache_file) as arrays:
+            # The ids are indexes in the names table, -1 is None (the last item of names)
+            names = arrays["names"].tobytes().decode("utf-8").split("\n") + [None]
+
+            def ids(key):
+                return [names[index] for index in arrays[key].tolist()]
+
+            shape_xy = arrays["shape_xy"]
+            net.junctions = dict(zip(ids("junction_ids"), map(tuple, arrays["junction_xy"].tolist())))
+
+            # The shapes are kept as views of shape_xy, each edge and lane has a (start, end) row range
+            for edge_id, from_id, to_id, (start, end) in zip(ids("edge_ids"), ids("edge_from"), ids("edge_to"),
+                                                             arrays["edge_shapes"].tolist()):
+                net.edges[edge_id] = (from_id, to_id, shape_xy[start:end])
+            for lane_id, edge_id, length, (start, end) in zip(ids("lane_ids"), ids("lane_edges"),
+                                                              arrays["lane_lengths"].tolist(),
+                                                              arrays["lane_shapes"].tolist()):
+                net.lanes[lane_id] = (edge_id, length, shape_xy[start:end])
+            for from_lane, to_lane in zip(ids("successor_from"), ids("successor_to")):
+                net.successors.setdefault(from_lane, []).append(to_lane)
+        return net
+
+    def save_cache(self, cache_file, **metadata):
+        """
+        Saves the net to a binary file that can be loaded with SumoNet.from_cache.
+        Each id is saved once in a table of names (joined in a single utf-8 string) and referenced by its index.
+        :param cache_file: a .npz file or a binary file object
+        :param metadata: other values saved in the file (used by load_net to check if the cache is stale)
+        :return: None
+        """
+        import numpy as np
+
+        shapes = []
+        n_rows = [0]
+
+        def add_shape(shape):
+            xy = np.asarray(parse_shape(shape) if isinstance(shape, str) else shape, dtype=np.float64).reshape(-1, 2)
+            shapes.append(xy)
+            n_rows[0] += len(xy)
+            return n_rows[0] - len(xy), n_rows[0]
+
+        edge_ids = list(self.edges)
+        edge_shapes = [add_shape(self.edges[edge_id][2]) for edge_id in edge_ids]
+        lane_ids = list(self.lanes)
+        lane_shapes = [add_shape(self.lanes[lane_id][2]) for lane_id in lane_ids]
+        junction_ids = list(self.junctions)
+        successor_pairs = [(from_lane, to_lane) for from_lane in self.successors
+                           for to_lane in self.successors[from_lane]]
+
+        names = []
+        name_index = {None: -1}
+
+        def indexes(ids):
+            for name in ids:
+                if name not in name_index:
+                    name_index[name] = len(names)
+                    names.append(name)
+            return np.array([name_index[name] for name in ids], dtype=np.int32)
+
+        np.savez(cache_file,
+                 version=self.CACHE_VERSION,
+                 junction_ids=indexes(junction_ids),
+                 junction_xy=np.array([self.junctions[x] for x in junction_ids], dtype=np.float64).reshape(-1, 2),
+                 edge_ids=indexes(edge_ids),
+                 edge_from=indexes([self.edges[x][0] for x in edge_ids]),
+                 edge_to=indexes([self.edges[x][1] for x in edge_ids]),
+                 edge_shapes=np.array(edge_shapes, dtype=np.int64).reshape(-1, 2),
+                 lane_ids=indexes(lane_ids),
+                 lane_edges=indexes([self.lanes[x][0] for x in lane_ids]),
+                 lane_lengths=np.array([self.lanes[x][1] for x in lane_ids], dtype=np.float64),
+                 lane_shapes=np.array(lane_shapes, dtype=np.int64).reshape(-1, 2),
+                 successor_from=indexes([pair[0] for pair in successor_pairs]),
+                 successor_to=indexes([pair[1] for pair in successor_pairs]),
+                 shape_xy=np.concatenate(shapes) if shapes else np.empty((0, 2)),
+                 names=np.frombuffer("\n".join(names).encode("utf-8"), dtype=np.uint8),
+                 **metadata)
+
+    def get_xy_from_point(self, point_id):
+        """
+        Gets the xy position for a point in the sumo net
+        :param point_id: the id of the point
+        :return: a float tuple in the format (x, y) or None if there is no such point
+        """
+        return self.junctions.get(point_id)
+
+    def edge_xy(self, edge_id):
+        """
+        Gets the xy positions of an edge from the cache, building them if it is the first time the edge is used.
+        :param edge_id: the id of the edge
+        :return: a tuple of float tuples each in the format (x, y) or None if there is no such edge
+        """
+        xy = self._xy_cache.get(edge_id)
+        if xy is not None:
+            if self.cache_size is not None:
+                self._xy_cache.move_to_end(edge_id)
+            return xy
+
+        if edge_id not in self.edges:
+            return None
+        from_id, to_id, shape = self.edges[edge_id]
+
+        xy_list = []
+        # First we add the position of the starting point
+        if from_id is not None:
+            xy_list.append(self.get_xy_from_point(from_id))
+
+        for xy_tuple in (parse_shape(shape) if isinstance(shape, str) else map(tuple, shape.tolist())):
+            if not (len(xy_list) > 0 and xy_tuple == xy_list[-1]):  # Avoid duplicates
+                xy_list.append(xy_tuple)
+
+        # Lastly we add the position of the ending point
+        if to_id is not None:
+            xy_list.append(self.get_xy_from_point(to_id))
+
+        xy = tuple(xy_list)
+        self._xy_cache[edge_id] = xy
+        if self.cache_size is not None and len(self._xy_cache) > self.cache_size:
+            self._xy_cache.popitem(last=False)
+        return xy
+
+    def edge_to_xy_list(self, edge_id):
+        """
+        Produces an xy list from the edge shape in the sumo net
+        :param edge_id: the id of the edge
+        :return: a list of float tuples each in the format (x, y) or None if there is no such edge
+        """
+        xy = self.edge_xy(edge_id)
+        return None if xy is None else list(xy)
+
+
+def _file_sha1(file_name):
+    import hashlib
+
+    sha1 = hashlib.sha1()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def load_net(net_file="osm.net.xml", cache_file=None, cache_size=None):
+    """
+    Loads a sumo net using a binary cache of the parsed net, so the xml is only parsed when the net changes.
+    The cache is used if the size and modification time of the net file did not change (or if its sha1 did not).
+    Otherwise the net file is parsed and the cache is rebuilt.
+    :param net_file: a *.net.xml file
+    :param cache_file: the cache file (default is the net file with the .cache.npz extension)
+    :param cache_size: the maximum number of edge xy lists kept in the cache of the SumoNet (default is unbounded)
+    :return: a SumoNet
+    """
+    import os
+    import tempfile
+    import numpy as np
+
+    if cache_file is None:
+        cache_file = net_file + ".cache.npz"
+    stat = os.stat(net_file)
+
+    if os.path.isfile(cache_file):
+        try:
+            with np.load(cache_file) as arrays:
+                same_version = int(arrays["version"]) == SumoNet.CACHE_VERSION
+                same_stat = (int(arrays["net_size"]), float(arrays["net_mtime"])) == (stat.st_size, stat.st_mtime)
+                net_sha1 = str(arrays["net_sha1"])
+
+            # The file may have just been touched or copied, so we check its contents before rebuilding
+            if same_version and (same_stat or net_sha1 == _file_sha1(net_file)):
+                return SumoNet.from_cache(cache_file, cache_size)
+        except (IOError, OSError, KeyError, ValueError):
+            pass  # A broken cache is rebuilt
+
+    net = SumoNet.from_file(net_file, cache_size)
+
+    # Writes to a unique temporary file first so a cache is never left half written, even if many processes
+    # rebuild it at the same time. The cache is optional, so a failed write (as a read-only directory) is ignored
+    temp_name = None
+    try:
+        temp_handle, temp_name = tempfile.mkstemp(prefix=os.path.basename(cache_file) + ".",
+                                                  dir=os.path.dirname(os.path.abspath(cache_file)))
+        with os.fdopen(temp_handle, "wb") as file:
+            net.save_cache(file, net_size=stat.st_size, net_mtime=stat.st_mtime, net_sha1=_file_sha1(net_file))
+        # mkstemp creates the file readable only by its owner, the cache gets the mode of a new file instead
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_name, 0o666 & ~umask)
+        os.replace(temp_name, cache_file)
+    except (IOError, OSError):
+        if temp_name is not None and os.path.exists(temp_name):
+            os.remove(temp_name)
+    return net
+
+
+def parse_shape(shape):
+    """
+    Parses a sumo shape.
+    :param shape: a string in the format "x1,y1 x2,y2 ..."
+    :return: a list of float tuples each in the format (x, y)
+    """
+    xy_list = []
+    # Each item of shape is a string in the format "x,y" we convert to to a float tuples (x, y)
+    for xy_string in shape.split(" "):
+        x, y = xy_string.split(",")[:2]
+        xy_list.append((float(x), float(y)))
+    return xy_list
+
 
-            # Each item of shape is a string in the format "x,y" we convert to to a float tuples (x, y)
-            for xy_string in shape:
-                xy_tuple = (float(xy_string.split(",")[0]), float(xy_string.split(",")[1]))
-                if not (len(xy_list) > 0 and xy_tuple == xy_list[-1]):  # Avoid duplicates
-                    xy_list.append(xy_tuple)
+def get_xy_from_point(point_list, point_id):
+    """
+    Gets the xy position for a point in the sumo net.
+    Scans the point list on each call, to look up many points use a SumoNet.
+    :param point_list: a list with all the points (generated using the set_lists function)
+    :param point_id: the id of the point
+    :return: a float tuple in the format (x, y) or None if there is no such point
+    """
+    for point in point_list:
+        if point.get("id") == point_id:
+            return float(point.get("x")), float(point.get("y"))
+    return None
 
-            # Lastly we add the position of the ending point
-            if "to" in edge.attrib:
-                xy_list.append(get_xy_from_point(point_list, edge.get("to")))
 
-            return xy_list
+def edge_to_xy_list(edge_list, point_list, edge_id):
+    """
+    Produces an xy list from the edge shape in the sumo net.
+    Scans the edge and point lists on each call, to convert many edges use a SumoNet.
+    :param edge_list: a list with all the edges (generated using the set_lists function)
+    :param point_list: a list with all the points (generated using the set_lists function)
+    :param edge_id: the id of the edge
+    :return: a list of float tuples each in the format (x, y) or None if there is no such edge
+    """
+    for edge in edge_list:
+        if edge.get("id") == edge_id:
+            # A SumoNet with only this edge and its junctions
+            junction_ids = (edge.get("from"), edge.get("to"))
+            points = [point for point in point_list if point.get("id") in junction_ids]
+            return SumoNet([edge], points).edge_to_xy_list(edge_id)
+    return None
 
 
-def generate_route_dict(vehicle_list=None, edge_list=None, point_list=None):
+def generate_route_dict(vehicle_list=None, edge_list=None, point_list=None, net=None, routes=None):
     """
     Produce a route dict representing the route of every vehicle in the simulation.
     Dict format: {<vehicle_id>: {"edges":<list_of_edges_in_route>, "xy": <list_of_xy_positions_in_the_route>}}
+    Vehicles with the same route share the same "edges" and "xy" lists, which are only computed once.
     :param vehicle_list: a list with all the vehicles (generated using the set_lists function)
     :param edge_list: a list with all the edges (generated using the set_lists function)
     :param point_list: a list with all the points (generated using the set_lists function)
+    :param net: a SumoNet (default will use the one of edge_list and point_list)
+    :param routes: an iterable of tuples (vehicle_id, vehicle_type, depart, <list_of_edges>) used instead of
+                   vehicle_list (see iter_routes)
     :return: a Python dict
     """
     import xml.etree.ElementTree as ET
 
     # Setting the lists if they are not set
-    if vehicle_list is None:
+    if routes is not None:
+        if net is None:
+            net = SumoNet(edge_list, point_list) if edge_list is not None and point_list is not None else load_net()
+    elif net is not None:
+        if vehicle_list is None:
+            vehicle_list, _, _ = set_lists(vehicle_list=[], edge_list=[], point_list=[], net_file=None)
+    elif vehicle_list is None:
         if edge_list is None:
             if point_list is None:
                 vehicle_list, edge_list, point_list = set_lists()
@@ -124,50 +498,99 @@ def generate_route_dict(vehicle_list=None, edge_list=None, point_list=None):
                 _, _, point_list = set_lists()
             # else: do nothing because every list is already set
 
+    if net is None:
+        net = SumoNet(edge_list, point_list)
+
+    if routes is None:
+        routes = _vehicle_routes(vehicle_list)
+
     # Start building the route_dict
     route_dict = {}
-    for vehicle in vehicle_list:
-        # Checks if the vehicle has a sub_element whose tag is "route". It's python
-        if "route" in [x.tag for x in vehicle]:
-
-            route_edges = []
-            # Get the edges that compose the route
-            for sub_elm in vehicle:
-                if sub_elm.tag == "route":  # We know there is only one route per vehicle
-                    route_edges = sub_elm.get("edges").split(" ")
-                    break
-
-            # add to the route_dict
-            route_dict[vehicle.get("id")] = {"edges": route_edges, "xy": []}
+    computed_routes = {}  # The routes already computed in the format {<tuple_of_edges>: <route>}
+    for vehicle_id, _, _, route_edges in routes:
+        # add to the route_dict
+        route_key = tuple(route_edges)
+        if route_key not in computed_routes:
+            computed_routes[route_key] = {"edges": route_edges, "xy": []}
             for edge in route_edges:
-                route_dict[vehicle.get("id")]["xy"] += edge_to_xy_list(edge_list, point_list, edge)
+                computed_routes[route_key]["xy"] += net.edge_xy(edge)
+        route_dict[vehicle_id] = computed_routes[route_key]
 
     return route_dict
 
 
-def export_route_dict_to_mobcons_path(route_dict=None):
+def _vehicle_routes(vehicle_list):
+    """
+    :param vehicle_list: a list of vehicle Elements (generated using the set_lists function)
+    :return: a generator of tuples in the format (vehicle_id, vehicle_type, depart, <list_of_edges>), as iter_routes
+             but with depart as the string in the file
+    """
+    for vehicle in vehicle_list:
+        # Get the edges that compose the route, we know there is only one route per vehicle
+        for sub_elm in vehicle:
+            if sub_elm.tag == "route":
+                yield vehicle.get("id"), vehicle.get("type"), vehicle.get("depart"), sub_elm.get("edges").split(" ")
+                break
+
+
+def iter_mobcons_paths(route_dict, precision=None):
+    """
+    Goes through the lines of the mobcons compatible paths of a route dict, one line per vehicle.
+    :param route_dict: a route dict (generated using the generate_route_dict function)
+    :param precision: the number of decimal places of the coordinates (default will write them as str(float))
+    :return: a generator of strings, the same ones returned by export_route_dict_to_mobcons_path
+    """
+    if precision is None:
+        xy_format = "[%r,%r]"
+    else:
+        xy_format = "[%." + str(int(precision)) + "f,%." + str(int(precision)) + "f]"
+
+    previous_line = "{ \"paths\": {\n"
+    for vehicle_id in route_dict:
+        if len(route_dict[vehicle_id]["xy"]) > 0:
+            yield previous_line
+            # Each vehicle path is joined at once instead of concatenating one position at a time
+            previous_line = "\"" + vehicle_id + "\": [" + \
+                ",".join([xy_format % (xy[0], xy[1]) for xy in route_dict[vehicle_id]["xy"]]) + "],\n"
+
+    yield previous_line[:-2]+"\n"  # Remove the coma from the last vehicle path and put the line break back
+    yield "}\n}"
+
+
+def write_route_dict_to_mobcons_path(route_dict, out_file, precision=None, close_after=False):
+    """
+    Writes the mobcons compatible paths of a route dict directly to a file, without keeping every line in memory.
+    :param route_dict: a route dict (generated using the generate_route_dict function)
+    :param out_file: a file or a path to a file where the paths will be written
+    :param precision: the number of decimal places of the coordinates (default will write them as str(float))
+    :param close_after: a boolean to state if the file should be closed after finishing
+    :return: None
+    """
+    if isinstance(out_file, str):
+        file = open(out_file, "w")
+        close_after = True
+    else:
+        file = out_file
+
+    for line in iter_mobcons_paths(route_dict, precision):
+        file.write(line)
+
+    if close_after:
+        file.close()
+
+
+def export_route_dict_to_mobcons_path(route_dict=None, precision=None):
     """
     Export a route dict to mobcons compatible paths
     :param route_dict: a route dict (generated using the generate_route_dict function)
+    :param precision: the number of decimal places of the coordinates (default will write them as str(float))
     :return: a list of strings, each containing a mobcons compatible path
     """
 
     if route_dict is None:
         route_dict = generate_route_dict()
 
-    paths = ["{ \"paths\": {\n"]
-    for vehicle_id in route_dict:
-        if len(route_dict[vehicle_id]["xy"]) > 0:
-            line = "\"" + vehicle_id + "\": ["
-            for xy in route_dict[vehicle_id]["xy"]:
-                line += "[" + str(xy[0]) + "," + str(xy[1]) + "],"
-
-            line = line[:-1] + "],\n"  # Remove the coma from the last line and closes the vehicle path
-            paths.append(line)
-    paths[-1] = paths[-1][:-2]+"\n"  # Remove the coma from the last vehicle path and put the line break back
-    paths.append("}\n}")
-
-    return paths
+    return list(iter_mobcons_paths(route_dict, precision))
 
 
 def save_route_dict_to_json_file(route_dict, json_file, close_after=False):
@@ -219,6 +642,127 @@ def load_route_dict_from_json_file(json_file, close_after=False):
     return route_dict
 
 
+def save_route_dict_to_columnar(route_dict, directory):
+    """
+    Saves a route dict in a columnar format that can be loaded lazily (see load_route_dict_from_columnar).
+    The directory will have:
+        xy.npy: every position of every route in one float64 array of shape (n, 2)
+        edges.npy: every edge of every route as an index in the edge table
+        ranges.npy: the (xy_start, xy_end, edges_start, edges_end) of each vehicle, vehicles with the same route
+                    share the same ranges
+        index.json: the vehicle ids (in the order of ranges.npy) and the edge table
+    :param route_dict: the route dict
+    :param directory: the directory where the files will be saved (it is created if it does not exist)
+    :return: None
+    """
+    import json
+    import os
+    import numpy as np
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    edge_table = []
+    edge_index = {}
+    xy_blocks = []
+    edge_blocks = []
+    ranges = []
+    ranges_by_route = {}  # The ranges already saved in the format {<tuple_of_edges>: <ranges>}
+    n_xy = 0
+    n_edges = 0
+
+    vehicle_ids = list(route_dict)
+    for vehicle_id in vehicle_ids:
+        route = route_dict[vehicle_id]
+        route_key = tuple(route["edges"])
+        if route_key not in ranges_by_route:
+            for edge in route["edges"]:
+                if edge not in edge_index:
+                    edge_index[edge] = len(edge_table)
+                    edge_table.append(edge)
+            edge_blocks.append(np.array([edge_index[edge] for edge in route["edges"]], dtype=np.int32))
+            xy_blocks.append(np.array(route["xy"], dtype=np.float64).reshape(-1, 2))
+
+            ranges_by_route[route_key] = (n_xy, n_xy + len(xy_blocks[-1]), n_edges, n_edges + len(edge_blocks[-1]))
+            n_xy += len(xy_blocks[-1])
+            n_edges += len(edge_blocks[-1])
+        ranges.append(ranges_by_route[route_key])
+
+    np.save(os.path.join(directory, "xy.npy"), np.concatenate(xy_blocks) if xy_blocks else np.empty((0, 2)))
+    np.save(os.path.join(directory, "edges.npy"),
+            np.concatenate(edge_blocks) if edge_blocks else np.empty(0, dtype=np.int32))
+    np.save(os.path.join(directory, "ranges.npy"), np.array(ranges, dtype=np.int64).reshape(-1, 4))
+    with open(os.path.join(directory, "index.json"), "w") as file:
+        json.dump({"vehicles": vehicle_ids, "edges": edge_table}, file)
+
+
+class ColumnarRouteDict:
+    """
+    A read only route dict loaded from the columnar format (see save_route_dict_to_columnar).
+    The arrays are memory-mapped, so the route of a vehicle is only read from the disk when it is accessed.
+    It can be used as the dicts generated using the generate_route_dict function.
+    """
+    def __init__(self, directory):
+        """
+        :param directory: the directory where the route dict was saved
+        """
+        import json
+        import os
+        import numpy as np
+
+        with open(os.path.join(directory, "index.json"), "r") as file:
+            index = json.load(file)
+        self.vehicle_ids = index["vehicles"]
+        self.edge_table = index["edges"]
+        self._vehicle_index = dict((vehicle_id, i) for i, vehicle_id in enumerate(self.vehicle_ids))
+
+        self._xy = np.load(os.path.join(directory, "xy.npy"), mmap_mode="r")
+        self._edges = np.load(os.path.join(directory, "edges.npy"), mmap_mode="r")
+        self._ranges = np.load(os.path.join(directory, "ranges.npy"), mmap_mode="r")
+
+    def xy(self, vehicle_id):
+        """
+        Gets the positions of the route of a vehicle without copying them.
+        :param vehicle_id: the id of the vehicle
+        :return: a read only numpy array of shape (n, 2)
+        """
+        xy_start, xy_end, _, _ = self._ranges[self._vehicle_index[vehicle_id]]
+        return self._xy[xy_start:xy_end]
+
+    def edges(self, vehicle_id):
+        """
+        Gets the edges of the route of a vehicle.
+        :param vehicle_id: the id of the vehicle
+        :return: a list of edge ids
+        """
+        _, _, edges_start, edges_end = self._ranges[self._vehicle_index[vehicle_id]]
+        return [self.edge_table[edge] for edge in self._edges[edges_start:edges_end].tolist()]
+
+    def __getitem__(self, vehicle_id):
+        return {"edges": self.edges(vehicle_id), "xy": self.xy(vehicle_id).tolist()}
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self._vehicle_index
+
+    def __iter__(self):
+        return iter(self.vehicle_ids)
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def keys(self):
+        return list(self.vehicle_ids)
+
+
+def load_route_dict_from_columnar(directory):
+    """
+    Loads a route dict saved with save_route_dict_to_columnar.
+    :param directory: the directory where the route dict was saved
+    :return: a ColumnarRouteDict
+    """
+    return ColumnarRouteDict(directory)
+
+
 def cleanup_output_folder():
     import os
 